@@ -2,16 +2,168 @@
 
 import asyncio
 import logging
+import os
+import secrets
+import signal
+from contextlib import suppress
+
+# Профиль запуска импортируется первым: от него отсчитывается время фаз
+from monitoring.startup import STARTUP_PROFILE, mark, report
+
+from aiohttp import web
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 # Импортируем конфигурацию
 from config import BOT_TOKEN
 
 # Импортируем роутеры из handlers
-from handlers import common, add_account
+from handlers import common, add_account, bulk_import, groups, stats
+
+# Импортируем функции для открытия и закрытия БД
+from database.db_manager import db_start, db_close
+# Состояния диалогов (FSM) в той же БД
+from database.fsm_storage import fsm_storage
+
+# Ограничение числа одновременно обрабатываемых апдейтов и метрики хендлеров
+from middlewares.concurrency import ConcurrencyLimitMiddleware
+from middlewares.metrics import MetricsMiddleware
+from middlewares.startup import FirstUpdateMiddleware
+from monitoring.metrics import gauge
+from monitoring.endpoint import start_metrics_server
+
+# Пул подключённых клиентов Telethon
+from userbot_logic.client_pool import client_pool
+# Фоновая перепроверка статусов сессий
+from userbot_logic.status_refresher import run_status_refresher
+# Постоянное прослушивание кодов от 777000
+from userbot_logic.code_listener import code_listener, CODE_LISTENER_ENABLED
+# Клиенты незавершённых входов в аккаунты
+from userbot_logic.login_registry import login_registry
+
+# Режим получения апдейтов: "polling" или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Адрес Bot API (например, локальный сервер или фейковый эндпоинт для тестов); пусто — api.telegram.org
+BOT_API_SERVER = os.getenv("BOT_API_SERVER", "")
+# Сбрасывать ли накопившиеся апдейты при запуске в режиме поллинга
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "1") == "1"
+# Сколько апдейтов обрабатывается одновременно
+UPDATES_CONCURRENCY = int(os.getenv("UPDATES_CONCURRENCY", "32"))
+
+# Настройки вебхука
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Сколько секунд при остановке ждать завершения уже принятых апдейтов
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+
+# Эндпоинт /metrics — только на отдельном METRICS_HOST:METRICS_PORT (если порт задан), в обоих режимах:
+# публичный сервер вебхука его не отдаёт
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+mark("импорт модулей")
+
+
+def create_bot() -> Bot:
+    """Создаёт бота, при необходимости направляя запросы на другой сервер Bot API."""
+    if BOT_API_SERVER:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_SERVER))
+        return Bot(token=BOT_TOKEN, session=session)
+    return Bot(token=BOT_TOKEN)
+
+
+def create_dispatcher() -> tuple[Dispatcher, ConcurrencyLimitMiddleware]:
+    """Создаёт диспетчер со всеми роутерами и middleware; возвращает его вместе с ограничителем апдейтов."""
+    # Состояния переживают перезапуск; при остановке диспетчер сам сбрасывает их в БД
+    dp = Dispatcher(storage=fsm_storage)
+
+    # Ограничиваем число одновременно обрабатываемых апдейтов
+    limiter = ConcurrencyLimitMiddleware(UPDATES_CONCURRENCY)
+    dp.update.outer_middleware(limiter)
+    if STARTUP_PROFILE:
+        dp.update.outer_middleware(FirstUpdateMiddleware())
+    gauge("updates_in_flight", "Апдейты, обрабатываемые прямо сейчас", lambda: limiter.in_flight)
+
+    # Замеряем задержку и ошибки хендлеров
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
+
+    # Включаем роутеры в главный диспетчер
+    dp.include_router(common.router)
+    dp.include_router(add_account.router)
+    dp.include_router(bulk_import.router)
+    dp.include_router(groups.router)
+    dp.include_router(stats.router)
+    return dp, limiter
+
+
+async def run_polling(bot: Bot, dp: Dispatcher, limiter: ConcurrencyLimitMiddleware):
+    """Получает апдейты через long polling; при остановке дожидается уже принятых апдейтов."""
+    # Удаляем вебхук, если он был установлен ранее
+    await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+    try:
+        # Сессию бота закрываем сами в main: она нужна апдейтам, которые ещё обрабатываются
+        await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        if not await limiter.drain(SHUTDOWN_TIMEOUT):
+            logging.warning(f"Остановка: не дождались {limiter.in_flight} апдейтов за {SHUTDOWN_TIMEOUT} с")
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, secret_token: str) -> web.Application:
+    """Собирает aiohttp-приложение вебхука: апдейты без верного секретного токена отклоняются с кодом 401."""
+    app = web.Application()
+    # Telegram получает ответ сразу, а апдейт обрабатывается в фоне (с учётом UPDATES_CONCURRENCY)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret_token, handle_in_background=True).register(
+        app, path=WEBHOOK_PATH
+    )
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, limiter: ConcurrencyLimitMiddleware):
+    """Принимает апдейты через вебхук на локальном aiohttp-сервере до получения SIGINT/SIGTERM."""
+    if not WEBHOOK_BASE_URL:
+        raise RuntimeError("Для режима webhook нужно задать WEBHOOK_BASE_URL")
+    # Без заданного секрета генерируем новый при каждом запуске: вебхук всё равно переустанавливается
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    app = create_webhook_app(bot, dp, secret_token)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+
+    # Накопившиеся апдейты не сбрасываем: они придут сразу после установки вебхука
+    await bot.set_webhook(
+        f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=secret_token,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False,
+    )
+    logging.info(f"Вебхук слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop_event.set)
+
+    try:
+        await stop_event.wait()
+    finally:
+        # Перестаём принимать новые запросы и даём досчитаться уже принятым апдейтам
+        await site.stop()
+        if not await limiter.drain(SHUTDOWN_TIMEOUT):
+            logging.warning(f"Остановка: не дождались {limiter.in_flight} апдейтов за {SHUTDOWN_TIMEOUT} с")
+        await runner.cleanup()
 
-# Импортируем функцию для инициализации БД
-from database.db_manager import db_start
 
 async def main():
     """Основная функция для запуска бота."""
@@ -19,21 +171,54 @@ async def main():
 
     # Инициализируем базу данных
     await db_start()
+    # Восстанавливаем незавершённые диалоги (например, добавление аккаунта)
+    await fsm_storage.start()
+    mark("открытие БД и миграции")
 
     # Создаем объекты бота и диспетчера
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
+    bot = create_bot()
+    dp, limiter = create_dispatcher()
+    mark("создание бота и диспетчера")
 
-    # Включаем роутеры в главный диспетчер
-    dp.include_router(common.router)
-    dp.include_router(add_account.router)
+    # Запускаем фоновое обновление кэша статусов сессий
+    refresher_task = asyncio.create_task(run_status_refresher())
+    # Подписываемся на коды от 777000, не задерживая запуск поллинга
+    if CODE_LISTENER_ENABLED:
+        listener_task = asyncio.create_task(code_listener.start(bot))
 
-    # Удаляем вебхук, если он был установлен ранее
-    await bot.delete_webhook(drop_pending_updates=True)
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
 
     print("Бот запущен...")
-    # Запускаем поллинг
-    await dp.start_polling(bot)
+    mark("готов к приёму апдейтов")
+    report()
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp, limiter)
+        else:
+            # Запускаем поллинг
+            await run_polling(bot, dp, limiter)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        refresher_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await refresher_task
+        if CODE_LISTENER_ENABLED:
+            listener_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await listener_task
+            await code_listener.stop()
+        # Отключаем клиенты незавершённых входов и все клиенты Telethon из пула
+        await login_registry.close()
+        await client_pool.close()
+        # Диспетчер закрывает хранилище FSM при остановке, но апдейты могли дописать состояния и после —
+        # сохраняем их уже после ожидания принятых апдейтов
+        await fsm_storage.close()
+        # Закрываем соединение с базой данных
+        await db_close()
+        await bot.session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+# file: benchmarks/fakes.py
+
+import asyncio
+import itertools
+import random
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message
+from telethon.crypto import AuthKey
+from telethon.errors import AuthKeyUnregisteredError, FloodWaitError, UnauthorizedError
+from telethon.sessions import StringSession
+
+# ID сервисного аккаунта Telegram, от имени которого приходят коды
+TELEGRAM_SERVICE_ID = 777000
+
+
+@dataclass
+class FakeBackend:
+    """Задержки и вероятность ошибок фейковых Telegram (Telethon) и Bot API."""
+    telegram_latency: float = 0.05
+    bot_latency: float = 0.02
+    # Разброс задержки: фактическая задержка равномерно распределена в latency * (1 ± jitter)
+    jitter: float = 0.3
+    telegram_error_rate: float = 0.0
+    bot_error_rate: float = 0.0
+    # Какие ошибки Telethon выбрасывать: "connection", "flood" и/или "revoked" (аннулированная сессия)
+    telegram_errors: tuple = ("connection",)
+    seed: int | None = None
+    requests: dict = field(default_factory=dict)
+    # Сколько ошибок было внесено
+    failures: int = 0
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+
+    async def delay(self, latency: float, name: str):
+        self.requests[name] = self.requests.get(name, 0) + 1
+        if latency > 0:
+            await asyncio.sleep(latency * self._random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def should_fail(self, rate: float) -> bool:
+        if rate > 0 and self._random.random() < rate:
+            self.failures += 1
+            return True
+        return False
+
+    def telegram_error(self) -> Exception:
+        kind = self._random.choice(self.telegram_errors)
+        if kind == "flood":
+            # Короткий FloodWait, который планировщик пережидает сам
+            return FloodWaitError(request=None, capture=0)
+        if kind == "revoked":
+            return AuthKeyUnregisteredError(request=None)
+        return ConnectionError("injected connection error")
+
+
+backend = FakeBackend()
+
+
+def make_session_string(dc_id: int = 2) -> str:
+    """Возвращает правдоподобную строку StringSession со случайным ключом авторизации."""
+    session = StringSession()
+    session.set_dc(dc_id, "149.154.167.51", 443)
+    session.auth_key = AuthKey(random.randbytes(256))
+    return session.save()
+
+
+class FakeTelegramClient:
+    """Замена TelegramClient: те же методы, что использует бот, но без сети."""
+
+    _ids = itertools.count(1_000_000)
+
+    def __init__(self, session, api_id: int, api_hash: str, **kwargs):
+        self.session = session if isinstance(session, StringSession) else StringSession()
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self._connected = False
+        self._phone = None
+
+    async def _request(self, name: str):
+        await backend.delay(backend.telegram_latency, name)
+        if backend.should_fail(backend.telegram_error_rate):
+            raise backend.telegram_error()
+
+    async def connect(self):
+        await self._request("connect")
+        self._connected = True
+
+    async def disconnect(self):
+        self._connected = False
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def is_user_authorized(self) -> bool:
+        await self._request("is_user_authorized")
+        return True
+
+    async def get_me(self):
+        # Как и настоящий get_me(), аннулированную сессию возвращает как None, а не ошибкой
+        try:
+            await self._request("get_me")
+        except UnauthorizedError:
+            return None
+        return SimpleNamespace(
+            id=next(self._ids), phone=self._phone or "79990000000", first_name="Bench", last_name=None,
+            username="bench", premium=False,
+        )
+
+    async def get_messages(self, entity, limit: int = 1):
+        await self._request("get_messages")
+        text = "Код для входа в Telegram: **12345**. Не давайте код никому."
+        return [SimpleNamespace(date=datetime.now(), text=text, sender_id=TELEGRAM_SERVICE_ID) for _ in range(limit)]
+
+    async def send_code_request(self, phone: str):
+        await self._request("send_code_request")
+        self._phone = phone.lstrip("+")
+        return SimpleNamespace(phone_code_hash="bench-hash")
+
+    async def sign_in(self, phone: str | None = None, code: str | None = None, password: str | None = None, **kwargs):
+        await self._request("sign_in")
+        if self.session.auth_key is None:
+            self.session.set_dc(2, "149.154.167.51", 443)
+            self.session.auth_key = AuthKey(random.randbytes(256))
+        return await self.get_me()
+
+    async def __call__(self, request, *args, **kwargs):
+        await self._request(type(request).__name__)
+        return SimpleNamespace()
+
+    def add_event_handler(self, callback, event=None):
+        pass
+
+    def remove_event_handler(self, callback, event=None):
+        pass
+
+
+class FakeBotSession(BaseSession):
+    """Сессия aiogram, отвечающая на запросы к Bot API локально с заданной задержкой."""
+
+    _message_ids = itertools.count(1)
+
+    async def close(self):
+        pass
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None) -> Any:
+        await backend.delay(backend.bot_latency, method.__api_method__)
+        if backend.should_fail(backend.bot_error_rate):
+            raise TelegramNetworkError(method=method, message="injected Bot API error")
+
+        returning = str(method.__returning__)
+        if "Message" not in returning:
+            return True
+        chat_id = getattr(method, "chat_id", None) or 1
+        return Message(
+            message_id=getattr(method, "message_id", None) or next(self._message_ids),
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            text=getattr(method, "text", None),
+        )
+
+    async def stream_content(self, url: str, headers: dict | None = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
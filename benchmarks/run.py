@@ -0,0 +1,291 @@
+# file: benchmarks/run.py
+"""
+Офлайн-бенчмарки бота: Telethon и Bot API заменены локальными фейками с настраиваемой задержкой и ошибками.
+
+Запуск из корня проекта:
+    python -m benchmarks.run --accounts 5000 --iterations 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from dataclasses import dataclass, asdict
+
+# ID владельца, от имени которого приходят апдейты сценариев
+BENCH_USER_ID = 1000
+# Первый user_id для новых пользователей сценария добавления аккаунта
+NEW_USERS_START = 10_000_000
+# Метка и размер группы для сценария массовой проверки
+BENCH_LABEL = "bench"
+BENCH_GROUP_SIZE = 100
+
+
+def install_config(db_path: str):
+    """Подменяет модуль config, чтобы бенчмарк не зависел от настоящих токенов и базы."""
+    config = types.ModuleType("config")
+    config.BOT_TOKEN = "123456:BENCHMARK"
+    config.OWNER_ID = BENCH_USER_ID
+    config.DB_NAME = db_path
+    config.API_ID = 1
+    config.API_HASH = "benchmark"
+    sys.modules["config"] = config
+
+
+def install_limits(real_limits: bool, encrypt: bool):
+    """Отключает ожидание в планировщике (если не нужны боевые лимиты) и при необходимости включает шифрование сессий."""
+    os.environ.setdefault("CODE_LISTENER", "0")
+    if encrypt:
+        from cryptography.fernet import Fernet
+        os.environ.setdefault("SESSION_ENCRYPTION_KEY", Fernet.generate_key().decode())
+    if not real_limits:
+        for name in ("SCHEDULER_ACCOUNT_RATE", "SCHEDULER_ACCOUNT_BURST", "SCHEDULER_API_ID_RATE", "SCHEDULER_API_ID_BURST"):
+            os.environ.setdefault(name, "1000000")
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    operations: int
+    # Операции, завершившиеся необработанным исключением, и ошибки, внесённые фейками
+    errors: int
+    injected_errors: int
+    p50_ms: float
+    p99_ms: float
+    throughput: float
+    peak_memory_kb: float | None
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Updates:
+    """Собирает апдейты Telegram так, как их присылает Bot API."""
+
+    def __init__(self):
+        from aiogram.types import Update
+        self._update_type = Update
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": "Bench"}
+
+    def callback(self, user_id: int, data: str):
+        update_id = next(self._ids)
+        return self._update_type.model_validate({
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": "bench",
+                "data": data,
+                "message": {"message_id": 1, "date": 0, "chat": {"id": user_id, "type": "private"}, "text": "bench"},
+            },
+        })
+
+    def message(self, user_id: int, text: str):
+        update_id = next(self._ids)
+        return self._update_type.model_validate({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id, "date": 0, "text": text,
+                "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id),
+            },
+        })
+
+
+def build_scenarios(updates: Updates, phones: list[str]) -> dict:
+    """Возвращает сценарии: функция от номера итерации, отдающая апдейты одной операции."""
+    new_users = itertools.count(NEW_USERS_START)
+
+    def add_account(i):
+        user_id = next(new_users)
+        return [
+            updates.callback(user_id, "add_account"),
+            updates.message(user_id, f"+7{user_id:010d}"),
+            updates.message(user_id, "12345"),
+        ]
+
+    return {
+        "my_accounts": lambda i: [updates.callback(BENCH_USER_ID, "my_accounts")],
+        "accounts_page": lambda i: [updates.callback(BENCH_USER_ID, f"accounts:a:{random.choice(phones)}:")],
+        "account_info": lambda i: [updates.callback(BENCH_USER_ID, f"info:{random.choice(phones)}")],
+        "show_codes": lambda i: [updates.callback(BENCH_USER_ID, f"show_codes:{random.choice(phones)}")],
+        "refresh_page": lambda i: [updates.callback(BENCH_USER_ID, f"refresh_accounts:a:{random.choice(phones)}:")],
+        "group_validate": lambda i: [updates.callback(BENCH_USER_ID, f"bulk:validate:{BENCH_LABEL}")],
+        "add_account": add_account,
+    }
+
+
+async def _run_pass(dp, bot, build, iterations: int, concurrency: int):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def operation(i):
+        nonlocal errors
+        async with semaphore:
+            batch = build(i)
+            started = time.perf_counter()
+            try:
+                for update in batch:
+                    await dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(operation(i) for i in range(iterations)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_scenario(dp, bot, name: str, build, iterations: int, concurrency: int, measure_memory: bool) -> ScenarioResult:
+    """Прогоняет сценарий: первый проход меряет задержку и пропускную способность, второй — пиковую память."""
+    from benchmarks import fakes
+
+    failures_before = fakes.backend.failures
+    latencies, errors, elapsed = await _run_pass(dp, bot, build, iterations, concurrency)
+    injected_errors = fakes.backend.failures - failures_before
+
+    peak_memory_kb = None
+    if measure_memory:
+        # tracemalloc сильно замедляет код, поэтому память меряется отдельным (уже «тёплым») проходом
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        await _run_pass(dp, bot, build, iterations, concurrency)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_memory_kb = (peak - baseline) / 1024
+
+    return ScenarioResult(
+        name=name,
+        operations=iterations,
+        errors=errors,
+        injected_errors=injected_errors,
+        p50_ms=_percentile(latencies, 0.5) * 1000,
+        p99_ms=_percentile(latencies, 0.99) * 1000,
+        throughput=iterations / elapsed,
+        peak_memory_kb=peak_memory_kb,
+    )
+
+
+async def seed_accounts(count: int, tenants: int) -> list[str]:
+    """Заполняет accounts: count аккаунтов у BENCH_USER_ID и столько же у каждого из остальных владельцев."""
+    from config import API_ID, API_HASH
+    from database.db_manager import db_save_accounts, db_set_account_labels
+    from benchmarks.fakes import make_session_string
+
+    session_string = make_session_string()
+    phones = [f"+7{9_000_000_000 + n}" for n in range(count)]
+    for owner in range(tenants):
+        user_id = BENCH_USER_ID + owner
+        await db_save_accounts((user_id, phone, API_ID, API_HASH, session_string) for phone in phones)
+    for phone in phones[:BENCH_GROUP_SIZE]:
+        await db_set_account_labels(BENCH_USER_ID, phone, [BENCH_LABEL])
+    return phones
+
+
+def patch_telegram_client():
+    """Подменяет TelegramClient: клиенты создаются через create_client, который импортирует его из telethon лениво."""
+    import telethon
+    from benchmarks.fakes import FakeTelegramClient
+
+    telethon.TelegramClient = FakeTelegramClient
+
+
+async def main(args):
+    # Ошибки, которые вносят фейки, хендлеры пишут в лог; по умолчанию он не мешает отчёту
+    logging.basicConfig(level=args.log_level)
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        install_config(os.path.join(tmp, "bench.db"))
+        install_limits(args.real_limits, args.encrypt)
+
+        from aiogram import Bot
+        from app import create_dispatcher
+        from benchmarks import fakes
+        from database.db_manager import db_start, db_close
+        from database.fsm_storage import fsm_storage
+        from userbot_logic.client_pool import client_pool
+        from userbot_logic.login_registry import login_registry
+
+        fakes.backend = fakes.FakeBackend(
+            telegram_latency=args.telegram_latency,
+            bot_latency=args.bot_latency,
+            telegram_error_rate=args.telegram_error_rate,
+            bot_error_rate=args.bot_error_rate,
+            telegram_errors=tuple(args.telegram_errors.split(",")),
+            seed=args.seed,
+        )
+        patch_telegram_client()
+
+        await db_start()
+        await fsm_storage.start()
+        bot = Bot(token="123456:BENCHMARK", session=fakes.FakeBotSession())
+        dp, _ = create_dispatcher()
+        try:
+            started = time.perf_counter()
+            phones = await seed_accounts(args.accounts, args.tenants)
+            print(f"Создано {args.accounts * args.tenants} аккаунтов за {time.perf_counter() - started:.2f} с", file=sys.stderr)
+
+            scenarios = build_scenarios(Updates(), phones)
+            names = args.scenarios.split(",") if args.scenarios else list(scenarios)
+            results = []
+            for name in names:
+                result = await run_scenario(
+                    dp, bot, name, scenarios[name], args.iterations, args.concurrency, not args.no_memory
+                )
+                results.append(result)
+                print(f"{name}: готово", file=sys.stderr)
+        finally:
+            await login_registry.close()
+            await client_pool.close()
+            await fsm_storage.close()
+            await db_close()
+            await bot.session.close()
+
+    if args.json:
+        print(json.dumps([asdict(result) for result in results], ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'сценарий':<16}{'операций':>10}{'ошибок':>8}{'внесено':>9}{'p50, мс':>10}{'p99, мс':>10}{'оп/с':>10}{'память, КБ':>12}")
+    for r in results:
+        memory = f"{r.peak_memory_kb:.0f}" if r.peak_memory_kb is not None else "-"
+        print(f"{r.name:<16}{r.operations:>10}{r.errors:>8}{r.injected_errors:>9}{r.p50_ms:>10.1f}{r.p99_ms:>10.1f}{r.throughput:>10.1f}{memory:>12}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарки с фейковыми Telegram и Bot API")
+    parser.add_argument("--accounts", type=int, default=5000, help="аккаунтов у каждого владельца")
+    parser.add_argument("--tenants", type=int, default=1, help="число владельцев с аккаунтами")
+    parser.add_argument("--iterations", type=int, default=200, help="операций в каждом сценарии")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных операций")
+    parser.add_argument("--scenarios", default="", help="сценарии через запятую (по умолчанию все)")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="задержка запроса Telethon, с")
+    parser.add_argument("--bot-latency", type=float, default=0.02, help="задержка запроса к Bot API, с")
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0, help="доля запросов Telethon с ошибкой")
+    parser.add_argument("--telegram-errors", default="connection", help="типы ошибок Telethon: connection,flood,revoked")
+    parser.add_argument("--bot-error-rate", type=float, default=0.0, help="доля запросов к Bot API с ошибкой")
+    parser.add_argument("--real-limits", action="store_true", help="не отключать лимиты планировщика запросов")
+    parser.add_argument("--encrypt", action="store_true", help="хранить сессии в БД зашифрованными")
+    parser.add_argument("--no-memory", action="store_true", help="не мерить пиковую память")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="CRITICAL", help="уровень логирования бота")
+    parser.add_argument("--json", action="store_true", help="вывести результаты в JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
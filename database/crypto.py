@@ -0,0 +1,114 @@
+# file: database/crypto.py
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from monitoring.metrics import counter
+
+# Ключ шифрования сессий (Fernet); сгенерировать: python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+SESSION_ENCRYPTION_KEY = os.getenv("SESSION_ENCRYPTION_KEY", "")
+# Сколько расшифрованных записей держать в памяти и сколько секунд
+DECRYPT_CACHE_SIZE = int(os.getenv("DECRYPT_CACHE_SIZE", "1024"))
+DECRYPT_CACHE_TTL = float(os.getenv("DECRYPT_CACHE_TTL", "600"))
+
+# Префикс зашифрованных значений: по нему они отличаются от ещё не перенесённых открытых
+ENCRYPTED_PREFIX = "enc:"
+
+_fernet = Fernet(SESSION_ENCRYPTION_KEY.encode()) if SESSION_ENCRYPTION_KEY else None
+
+DECRYPT_CACHE = counter("session_decrypt_cache_total", "Обращения к кэшу расшифрованных сессий")
+
+
+def encryption_enabled() -> bool:
+    return _fernet is not None
+
+
+def is_encrypted(value: str) -> bool:
+    return value.startswith(ENCRYPTED_PREFIX)
+
+
+def encrypt_value(value: str) -> str:
+    """Шифрует строку для записи в БД; без ключа возвращает её как есть."""
+    if _fernet is None or is_encrypted(value):
+        return value
+    return ENCRYPTED_PREFIX + _fernet.encrypt(value.encode()).decode()
+
+
+def decrypt_value(value: str) -> str:
+    """Расшифровывает значение из БД; открытые (ещё не перенесённые) значения возвращаются как есть."""
+    if not is_encrypted(value):
+        return value
+    if _fernet is None:
+        raise RuntimeError("В базе есть зашифрованные сессии, но SESSION_ENCRYPTION_KEY не задан")
+    try:
+        return _fernet.decrypt(value[len(ENCRYPTED_PREFIX):].encode()).decode()
+    except InvalidToken:
+        raise RuntimeError("Не удалось расшифровать сессию: неверный SESSION_ENCRYPTION_KEY") from None
+
+
+class DecryptedCache:
+    """LRU-кэш расшифрованных значений с TTL; запись действительна, пока не изменился шифротекст."""
+
+    def __init__(self, max_size: int = DECRYPT_CACHE_SIZE, ttl: float = DECRYPT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (шифротекст, расшифрованное значение, момент истечения)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, sealed: tuple) -> tuple | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        cached_sealed, value, expires_at = entry
+        if cached_sealed != sealed or expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, sealed: tuple, value: tuple):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (sealed, value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+decrypted_cache = DecryptedCache()
+
+
+def open_credentials(user_id: int, phone: str, api_hash: str, session_string: str) -> tuple[str, str]:
+    """Возвращает расшифрованные (api_hash, session_string) аккаунта, по возможности из кэша."""
+    if not (is_encrypted(api_hash) or is_encrypted(session_string)):
+        return api_hash, session_string
+    key = (user_id, phone)
+    sealed = (api_hash, session_string)
+    value = decrypted_cache.get(key, sealed)
+    if value is not None:
+        DECRYPT_CACHE.inc(result="hit")
+        return value
+    DECRYPT_CACHE.inc(result="miss")
+    value = (decrypt_value(api_hash), decrypt_value(session_string))
+    decrypted_cache.put(key, sealed, value)
+    return value
+
+
+def warn_if_disabled():
+    if _fernet is None:
+        logging.warning("SESSION_ENCRYPTION_KEY не задан: сессии и api_hash хранятся в БД в открытом виде")
@@ -1,46 +1,413 @@
 # file: database/db_manager.py
 
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable
+
 import aiosqlite
 from config import DB_NAME
+from database.migrations import run_migrations
+from database.crypto import (
+    ENCRYPTED_PREFIX, decrypted_cache, decrypt_value, encrypt_value, encryption_enabled, open_credentials,
+    warn_if_disabled,
+)
+from monitoring.metrics import timed
+
+# Единственное долгоживущее соединение с БД (открывается в db_start)
+_db: aiosqlite.Connection | None = None
+# Все записи идут через одного писателя, чтобы транзакции не перемешивались
+_write_lock = asyncio.Lock()
+
+# Счётчик изменений аккаунтов и их статусов по user_id: по нему инвалидируются кэши списков
+_accounts_versions: dict[int, int] = {}
+# Счётчик добавлений, замен и удалений аккаунтов (без статусов): по нему инвалидируется сводка
+_accounts_set_versions: dict[int, int] = {}
+
+# Отметка в meta: все записи accounts зашифрованы. Открытые записи появляются только при запуске без ключа,
+# поэтому такой запуск отметку снимает, а следующий запуск с ключом снова проверяет таблицу
+_ENCRYPTED_MARK = "accounts_encrypted"
+
+# Прагмы, применяемые при открытии соединения
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _get_db() -> aiosqlite.Connection:
+    if _db is None:
+        raise RuntimeError("База данных не инициализирована: сначала вызовите db_start()")
+    return _db
+
+
+def _bump_accounts_version(*user_ids: int, accounts_changed: bool = False):
+    for user_id in user_ids:
+        _accounts_versions[user_id] = _accounts_versions.get(user_id, 0) + 1
+        if accounts_changed:
+            _accounts_set_versions[user_id] = _accounts_set_versions.get(user_id, 0) + 1
+
+
+def get_accounts_version(user_id: int) -> int:
+    """Возвращает номер версии списка аккаунтов пользователя; меняется при любом изменении аккаунтов или статусов."""
+    return _accounts_versions.get(user_id, 0)
+
+
+def get_accounts_set_version(user_id: int) -> int:
+    """Возвращает номер версии набора аккаунтов пользователя; меняется при добавлении, замене или удалении аккаунта."""
+    return _accounts_set_versions.get(user_id, 0)
+
+
+@asynccontextmanager
+async def _write() -> AsyncIterator[aiosqlite.Connection]:
+    """Выполняет запись в одной транзакции под общим замком писателя."""
+    db = _get_db()
+    async with _write_lock:
+        try:
+            yield db
+        except BaseException:
+            await db.rollback()
+            raise
+        else:
+            await db.commit()
+
 
 async def db_start():
-    """Инициализирует базу данных и создает таблицу, если она не существует."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS accounts (
-                user_id INTEGER NOT NULL,
-                phone TEXT NOT NULL,
-                api_id INTEGER NOT NULL,
-                api_hash TEXT NOT NULL,
-                session_string TEXT NOT NULL,
-                PRIMARY KEY (user_id, phone)
-            );
-        """)
-        await db.commit()
+    """Открывает общее соединение с базой данных и применяет недостающие миграции схемы."""
+    global _db
+    if _db is not None:
+        return
+    _db = await aiosqlite.connect(DB_NAME)
+    for pragma in _PRAGMAS:
+        await _db.execute(pragma)
 
+    async with _write_lock:
+        await run_migrations(_db)
+
+    warn_if_disabled()
+    async with _get_db().execute("SELECT 1 FROM meta WHERE key = ?", (_ENCRYPTED_MARK,)) as cursor:
+        marked = await cursor.fetchone() is not None
+    if encryption_enabled() and not marked:
+        await _encrypt_plaintext_rows()
+        async with _write() as db:
+            await db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, '1')", (_ENCRYPTED_MARK,))
+    elif not encryption_enabled() and marked:
+        async with _write() as db:
+            await db.execute("DELETE FROM meta WHERE key = ?", (_ENCRYPTED_MARK,))
+
+
+async def _encrypt_plaintext_rows(batch_size: int = 500):
+    """Шифрует записи, сохранённые до включения шифрования; выполняется, пока в meta нет отметки об этом."""
+    migrated = 0
+    while True:
+        async with _get_db().execute(
+            "SELECT user_id, phone, api_hash, session_string FROM accounts "
+            "WHERE api_hash NOT LIKE ? OR session_string NOT LIKE ? LIMIT ?",
+            (ENCRYPTED_PREFIX + "%", ENCRYPTED_PREFIX + "%", batch_size)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        if not rows:
+            break
+        async with _write() as db:
+            await db.executemany(
+                "UPDATE accounts SET api_hash = ?, session_string = ? WHERE user_id = ? AND phone = ?",
+                [(encrypt_value(api_hash), encrypt_value(session_string), user_id, phone)
+                 for user_id, phone, api_hash, session_string in rows]
+            )
+        migrated += len(rows)
+    if migrated:
+        logging.info(f"Зашифровано аккаунтов, сохранённых в открытом виде: {migrated}")
+
+
+async def db_close():
+    """Закрывает общее соединение с базой данных."""
+    global _db
+    if _db is None:
+        return
+    async with _write_lock:
+        await _db.close()
+        _db = None
+
+
+@timed("db")
 async def db_save_account(user_id: int, phone: str, api_id: int, api_hash: str, session_string: str):
     """Сохраняет или обновляет данные аккаунта в БД."""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
+        # При замене сессии метки и время добавления сохраняются, а статус старой сессии сбрасывается
         await db.execute(
-            "INSERT OR REPLACE INTO accounts (user_id, phone, api_id, api_hash, session_string) VALUES (?, ?, ?, ?, ?)",
-            (user_id, phone, api_id, api_hash, session_string)
+            """
+            INSERT INTO accounts (user_id, phone, api_id, api_hash, session_string, created_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, phone) DO UPDATE SET
+                api_id = excluded.api_id, api_hash = excluded.api_hash, session_string = excluded.session_string,
+                status = NULL, last_checked = NULL, check_failed_at = NULL
+            """,
+            (user_id, phone, api_id, encrypt_value(api_hash), encrypt_value(session_string), time.time())
         )
-        await db.commit()
+    decrypted_cache.invalidate((user_id, phone))
+    _bump_accounts_version(user_id, accounts_changed=True)
+
 
+@timed("db")
+async def db_save_accounts(accounts: Iterable[tuple[int, str, int, str, str]]):
+    """Сохраняет пачку аккаунтов (user_id, phone, api_id, api_hash, session_string) одной транзакцией."""
+    accounts = list(accounts)
+    created_at = time.time()
+    async with _write() as db:
+        await db.executemany(
+            """
+            INSERT INTO accounts (user_id, phone, api_id, api_hash, session_string, created_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, phone) DO UPDATE SET
+                api_id = excluded.api_id, api_hash = excluded.api_hash, session_string = excluded.session_string,
+                status = NULL, last_checked = NULL, check_failed_at = NULL
+            """,
+            [(user_id, phone, api_id, encrypt_value(api_hash), encrypt_value(session_string), created_at)
+             for user_id, phone, api_id, api_hash, session_string in accounts]
+        )
+    decrypted_cache.invalidate(*((user_id, phone) for user_id, phone, *_ in accounts))
+    _bump_accounts_version(*{user_id for user_id, *_ in accounts}, accounts_changed=True)
+
+
+@timed("db")
 async def db_get_user_accounts(user_id: int) -> list[str]:
     """Возвращает список телефонов всех аккаунтов пользователя."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT phone FROM accounts WHERE user_id = ?", (user_id,))
+    async with _get_db().execute("SELECT phone FROM accounts WHERE user_id = ?", (user_id,)) as cursor:
         return [row[0] for row in await cursor.fetchall()]
 
+
+@timed("db")
+async def db_get_user_accounts_details(user_id: int) -> list[tuple[str, int, str, str]]:
+    """Возвращает (phone, api_id, api_hash, session_string) всех аккаунтов пользователя одним запросом."""
+    async with _get_db().execute(
+        "SELECT phone, api_id, api_hash, session_string FROM accounts WHERE user_id = ?", (user_id,)
+    ) as cursor:
+        return [
+            (phone, api_id, *open_credentials(user_id, phone, api_hash, session_string))
+            for phone, api_id, api_hash, session_string in await cursor.fetchall()
+        ]
+
+
+@timed("db")
+async def db_get_all_accounts() -> list[tuple[int, str, int, str, str]]:
+    """Возвращает (user_id, phone, api_id, api_hash, session_string) всех аккаунтов всех пользователей."""
+    async with _get_db().execute(
+        "SELECT user_id, phone, api_id, api_hash, session_string FROM accounts"
+    ) as cursor:
+        return [
+            (user_id, phone, api_id, *open_credentials(user_id, phone, api_hash, session_string))
+            for user_id, phone, api_id, api_hash, session_string in await cursor.fetchall()
+        ]
+
+
+@timed("db")
 async def db_get_account_details(user_id: int, phone: str) -> tuple | None:
     """Возвращает детали конкретного аккаунта."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT api_id, api_hash, session_string FROM accounts WHERE user_id = ? AND phone = ?", (user_id, phone))
-        return await cursor.fetchone()
+    async with _get_db().execute(
+        "SELECT api_id, api_hash, session_string FROM accounts WHERE user_id = ? AND phone = ?", (user_id, phone)
+    ) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    api_id, api_hash, session_string = row
+    return (api_id, *open_credentials(user_id, phone, api_hash, session_string))
+
 
+@timed("db")
 async def db_delete_account(user_id: int, phone: str):
     """Удаляет аккаунт из БД."""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         await db.execute("DELETE FROM accounts WHERE user_id = ? AND phone = ?", (user_id, phone))
-        await db.commit()
\ No newline at end of file
+    decrypted_cache.invalidate((user_id, phone))
+    _bump_accounts_version(user_id, accounts_changed=True)
+
+
+@timed("db")
+async def db_set_accounts_status(user_id: int, statuses: Iterable[tuple[str, bool]], checked_at: float):
+    """Сохраняет результаты проверки сессий (phone, is_valid) пользователя одной транзакцией."""
+    async with _write() as db:
+        # Аккаунты, удалённые, пока шла проверка, просто не найдутся
+        await db.executemany(
+            "UPDATE accounts SET status = ?, last_checked = ?, check_failed_at = NULL WHERE user_id = ? AND phone = ?",
+            [(int(is_valid), checked_at, user_id, phone) for phone, is_valid in statuses]
+        )
+    _bump_accounts_version(user_id)
+
+
+@timed("db")
+async def db_set_status_checks_failed(accounts: Iterable[tuple[int, str]], failed_at: float):
+    """Отмечает аккаунты (user_id, phone), проверить которые не удалось; статус и время проверки не меняются."""
+    async with _write() as db:
+        await db.executemany(
+            "UPDATE accounts SET check_failed_at = ? WHERE user_id = ? AND phone = ?",
+            [(failed_at, user_id, phone) for user_id, phone in accounts]
+        )
+
+
+@timed("db")
+async def db_get_user_accounts_page(
+    user_id: int,
+    limit: int,
+    after: str | None = None,
+    before: str | None = None,
+    prefix: str = "",
+) -> tuple[list[tuple[str, bool | None, float | None]], bool]:
+    """
+    Возвращает страницу (phone, is_valid, last_checked) аккаунтов пользователя, отсортированных по номеру,
+    и признак того, что дальше (в направлении листания) есть ещё записи.
+    Пагинация keyset-ная: after — следующая страница, before — предыдущая; prefix фильтрует по началу номера.
+    """
+    conditions = ["user_id = ?"]
+    params: list = [user_id]
+    if prefix:
+        # Диапазон вместо LIKE, чтобы поиск шёл по индексу
+        conditions.append("phone >= ? AND phone < ?")
+        params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+    if after is not None:
+        conditions.append("phone > ?")
+        params.append(after)
+    if before is not None:
+        conditions.append("phone < ?")
+        params.append(before)
+    order = "DESC" if before is not None else "ASC"
+
+    async with _get_db().execute(
+        f"""
+        SELECT phone, status, last_checked
+        FROM accounts
+        WHERE {" AND ".join(conditions)}
+        ORDER BY phone {order}
+        LIMIT ?
+        """,
+        (*params, limit + 1)
+    ) as cursor:
+        rows = [
+            (phone, None if is_valid is None else bool(is_valid), last_checked)
+            for phone, is_valid, last_checked in await cursor.fetchall()
+        ]
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+    return rows, has_more
+
+
+@timed("db")
+async def db_get_accounts_details(user_id: int, phones: list[str]) -> list[tuple[str, int, str, str]]:
+    """Возвращает (phone, api_id, api_hash, session_string) указанных аккаунтов пользователя одним запросом."""
+    if not phones:
+        return []
+    placeholders = ", ".join("?" * len(phones))
+    async with _get_db().execute(
+        f"SELECT phone, api_id, api_hash, session_string FROM accounts WHERE user_id = ? AND phone IN ({placeholders})",
+        (user_id, *phones)
+    ) as cursor:
+        return [
+            (phone, api_id, *open_credentials(user_id, phone, api_hash, session_string))
+            for phone, api_id, api_hash, session_string in await cursor.fetchall()
+        ]
+
+
+@timed("db")
+async def db_get_stale_accounts(
+    checked_before: float, failed_before: float, limit: int
+) -> list[tuple[int, str, int, str, str]]:
+    """
+    Возвращает (user_id, phone, api_id, api_hash, session_string) аккаунтов, чей статус не проверялся с checked_before.
+    Аккаунты, проверка которых не удалась после failed_before, пропускаются: иначе они, как самые старые, занимали бы каждый проход.
+    """
+    not_failed = "AND (check_failed_at IS NULL OR check_failed_at < ?)"
+    # Два запроса вместо одного с OR: каждый идёт по idx_accounts_last_checked и читает не больше limit строк
+    queries = (
+        (f"WHERE last_checked IS NULL {not_failed}", (failed_before,)),
+        (f"WHERE last_checked < ? {not_failed} ORDER BY last_checked", (checked_before, failed_before)),
+    )
+    rows = []
+    for condition, params in queries:
+        if len(rows) >= limit:
+            break
+        async with _get_db().execute(
+            f"SELECT user_id, phone, api_id, api_hash, session_string FROM accounts {condition} LIMIT ?",
+            (*params, limit - len(rows))
+        ) as cursor:
+            rows += await cursor.fetchall()
+    return [
+        (user_id, phone, api_id, *open_credentials(user_id, phone, api_hash, session_string))
+        for user_id, phone, api_id, api_hash, session_string in rows
+    ]
+
+
+@timed("db")
+async def db_set_account_labels(user_id: int, phone: str, labels: list[str]):
+    """Заменяет метки (группы) аккаунта."""
+    async with _write() as db:
+        await db.execute(
+            "UPDATE accounts SET labels = ? WHERE user_id = ? AND phone = ?", (",".join(labels), user_id, phone)
+        )
+
+
+@timed("db")
+async def db_get_account_labels(user_id: int, phone: str) -> list[str]:
+    """Возвращает метки аккаунта."""
+    async with _get_db().execute(
+        "SELECT labels FROM accounts WHERE user_id = ? AND phone = ?", (user_id, phone)
+    ) as cursor:
+        row = await cursor.fetchone()
+    return row[0].split(",") if row and row[0] else []
+
+
+@timed("db")
+async def db_get_user_labels(user_id: int) -> list[tuple[str, int]]:
+    """Возвращает метки пользователя с числом аккаунтов в каждой, по алфавиту."""
+    counts: dict[str, int] = {}
+    async with _get_db().execute(
+        "SELECT labels FROM accounts WHERE user_id = ? AND labels != ''", (user_id,)
+    ) as cursor:
+        async for (labels,) in cursor:
+            for label in labels.split(","):
+                counts[label] = counts.get(label, 0) + 1
+    return sorted(counts.items())
+
+
+@timed("db")
+async def db_get_accounts_by_label(user_id: int, label: str | None) -> list[tuple[str, int, str, str]]:
+    """Возвращает (phone, api_id, api_hash, session_string) аккаунтов с меткой label (None — все аккаунты пользователя)."""
+    if label is None:
+        return await db_get_user_accounts_details(user_id)
+    # Метки хранятся через запятую, поэтому ищем ",label," в ",labels,"
+    async with _get_db().execute(
+        "SELECT phone, api_id, api_hash, session_string FROM accounts "
+        "WHERE user_id = ? AND instr(',' || labels || ',', ?) > 0 ORDER BY phone",
+        (user_id, f",{label},")
+    ) as cursor:
+        return [
+            (phone, api_id, *open_credentials(user_id, phone, api_hash, session_string))
+            for phone, api_id, api_hash, session_string in await cursor.fetchall()
+        ]
+
+
+@timed("db")
+async def db_load_fsm_states(updated_after: float) -> list[tuple[str, str | None, str, float]]:
+    """Удаляет состояния FSM старше updated_after и возвращает остальные: (key, state, data в JSON, updated_at)."""
+    async with _write() as db:
+        await db.execute("DELETE FROM fsm_states WHERE updated_at <= ?", (updated_after,))
+    async with _get_db().execute("SELECT key, state, data, updated_at FROM fsm_states") as cursor:
+        return [(key, state, decrypt_value(data), updated_at) for key, state, data, updated_at in await cursor.fetchall()]
+
+
+@timed("db")
+async def db_save_fsm_states(states: Iterable[tuple[str, str | None, str, float]], deleted: Iterable[str]):
+    """Записывает пачку состояний FSM (key, state, data в JSON, updated_at) и удаляет сброшенные — одной транзакцией."""
+    async with _write() as db:
+        await db.executemany(
+            """
+            INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+            """,
+            [(key, state, encrypt_value(data), updated_at) for key, state, data, updated_at in states]
+        )
+        await db.executemany("DELETE FROM fsm_states WHERE key = ?", [(key,) for key in deleted])
@@ -0,0 +1,156 @@
+# file: database/fsm_storage.py
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from database.db_manager import db_load_fsm_states, db_save_fsm_states
+from monitoring.metrics import gauge
+
+# Через сколько секунд без изменений состояние диалога считается брошенным и удаляется
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "3600"))
+# Как часто изменённые состояния сбрасываются в БД, в секундах (при аварийном завершении теряются изменения за этот срок)
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "5"))
+
+
+@dataclass
+class _FSMEntry:
+    state: str | None = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = field(default_factory=time.time)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM в общей БД: состояния читаются из памяти, а изменения пачкой
+    сбрасываются в БД фоновой задачей раз в FSM_FLUSH_INTERVAL и при остановке.
+    """
+
+    def __init__(self, ttl: float = FSM_STATE_TTL, flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self._entries: dict[str, _FSMEntry] = {}
+        # Ключи, изменённые (или удалённые) после последнего сброса в БД
+        self._dirty: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        # Загружено ли хранилище из БД: до start() (и без БД) оно работает только в памяти
+        self._started = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def start(self):
+        """Загружает из БД несброшенные и не истёкшие состояния и запускает фоновый сброс изменений."""
+        if self._flusher is not None:
+            return
+        for key, state, data, updated_at in await db_load_fsm_states(time.time() - self.ttl):
+            # Изменения, сделанные до start(), новее сохранённых в БД
+            self._entries.setdefault(key, _FSMEntry(state, json.loads(data), updated_at))
+        self._started = True
+        self._flusher = asyncio.create_task(self._run_flusher())
+
+    def _get(self, key: StorageKey) -> tuple[str, _FSMEntry | None]:
+        storage_key = self._key_builder.build(key)
+        entry = self._entries.get(storage_key)
+        if entry is not None and time.time() - entry.updated_at > self.ttl:
+            self._entries.pop(storage_key)
+            self._dirty.add(storage_key)
+            entry = None
+        return storage_key, entry
+
+    def _put(self, storage_key: str, entry: _FSMEntry):
+        entry.updated_at = time.time()
+        # Пустое состояние не храним: в БД его строка удаляется при сбросе
+        if entry.state is None and not entry.data:
+            self._entries.pop(storage_key, None)
+        else:
+            self._entries[storage_key] = entry
+        self._dirty.add(storage_key)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key, entry = self._get(key)
+        entry = entry or _FSMEntry()
+        entry.state = state.state if isinstance(state, State) else state
+        self._put(storage_key, entry)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        _, entry = self._get(key)
+        return entry.state if entry else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        storage_key, entry = self._get(key)
+        entry = entry or _FSMEntry()
+        entry.data = dict(data)
+        self._put(storage_key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, entry = self._get(key)
+        return dict(entry.data) if entry else {}
+
+    def _expire(self):
+        """Удаляет из памяти брошенные состояния; из БД они удалятся при следующем сбросе."""
+        expired_before = time.time() - self.ttl
+        for storage_key in [k for k, entry in self._entries.items() if entry.updated_at < expired_before]:
+            self._entries.pop(storage_key)
+            self._dirty.add(storage_key)
+
+    async def flush(self):
+        """Сбрасывает в БД все изменения, накопленные с прошлого сброса."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            states, deleted = [], []
+            for storage_key in dirty:
+                entry = self._entries.get(storage_key)
+                if entry is None:
+                    deleted.append(storage_key)
+                else:
+                    states.append((storage_key, entry.state, json.dumps(entry.data, ensure_ascii=False), entry.updated_at))
+            try:
+                await db_save_fsm_states(states, deleted)
+            except BaseException:
+                # Не потеряли изменения: повторим при следующем сбросе
+                self._dirty |= dirty
+                raise
+
+    async def _run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self._expire()
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Ошибка сохранения состояний FSM: {e}")
+
+    async def close(self) -> None:
+        """
+        Останавливает фоновый сброс и записывает оставшиеся изменения. Вызывается диспетчером при остановке
+        и ещё раз при завершении бота: изменения, сделанные между вызовами, тоже сохраняются.
+        """
+        flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            flusher.cancel()
+            with suppress(asyncio.CancelledError):
+                await flusher
+        if not self._started:
+            return
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"Не удалось сохранить состояния FSM при остановке: {e}")
+
+
+fsm_storage = SQLiteStorage()
+
+gauge("fsm_states", "Активные состояния FSM диалогов", fsm_storage.__len__)
@@ -0,0 +1,115 @@
+# file: database/migrations.py
+
+import logging
+from typing import Awaitable, Callable
+
+import aiosqlite
+
+
+async def _create_accounts(db: aiosqlite.Connection):
+    """1: исходная таблица аккаунтов."""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS accounts (
+            user_id INTEGER NOT NULL,
+            phone TEXT NOT NULL,
+            api_id INTEGER NOT NULL,
+            api_hash TEXT NOT NULL,
+            session_string TEXT NOT NULL,
+            PRIMARY KEY (user_id, phone)
+        );
+    """)
+
+
+async def _add_account_columns(db: aiosqlite.Connection):
+    """2: статус сессии, время проверки, метки и время добавления — в колонках accounts вместо account_status."""
+    # status: 1 — сессия действительна, 0 — аннулирована, NULL — ещё не проверялась
+    await db.execute("ALTER TABLE accounts ADD COLUMN status INTEGER")
+    await db.execute("ALTER TABLE accounts ADD COLUMN last_checked REAL")
+    # Метки через запятую, например "farm,ru"
+    await db.execute("ALTER TABLE accounts ADD COLUMN labels TEXT NOT NULL DEFAULT ''")
+    # Для аккаунтов, добавленных до этой миграции, время добавления неизвестно
+    await db.execute("ALTER TABLE accounts ADD COLUMN created_at REAL")
+
+    async with db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'account_status'") as cursor:
+        has_status_table = await cursor.fetchone() is not None
+    if has_status_table:
+        await db.execute("""
+            UPDATE accounts SET (status, last_checked) = (
+                SELECT s.is_valid, s.last_checked FROM account_status s
+                WHERE s.user_id = accounts.user_id AND s.phone = accounts.phone
+            )
+        """)
+        await db.execute("DROP TABLE account_status")
+
+
+async def _add_indexes(db: aiosqlite.Connection):
+    """3: индексы для списков, статусов и фоновой перепроверки."""
+    # Покрывающий индекс страницы списка: строки с длинными сессиями при листании не читаются
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_accounts_page ON accounts (user_id, phone, status, last_checked)"
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_accounts_user_status ON accounts (user_id, status)")
+    # NULL сортируются первыми, поэтому непроверенные аккаунты идут раньше давно проверенных
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_accounts_last_checked ON accounts (last_checked)")
+
+
+async def _create_fsm_states(db: aiosqlite.Connection):
+    """4: состояния FSM диалогов, чтобы перезапуск бота не обрывал добавление аккаунта."""
+    # key — ключ aiogram (бот, чат, пользователь...), data — JSON данных состояния (зашифрованный, если задан ключ)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states (updated_at)")
+
+
+async def _create_meta(db: aiosqlite.Connection):
+    """5: служебные отметки бота (например, что открытые записи уже зашифрованы)."""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """)
+
+
+async def _add_check_failed_at(db: aiosqlite.Connection):
+    """6: время последней неудачной фоновой проверки, чтобы такие аккаунты не занимали каждый проход."""
+    # NULL — последняя проверка удалась (или её не было)
+    await db.execute("ALTER TABLE accounts ADD COLUMN check_failed_at REAL")
+
+
+# Миграции по порядку; номер миграции — её позиция в списке, начиная с 1. Уже выпущенные миграции не менять.
+MIGRATIONS: list[Callable[[aiosqlite.Connection], Awaitable[None]]] = [
+    _create_accounts,
+    _add_account_columns,
+    _add_indexes,
+    _create_fsm_states,
+    _create_meta,
+    _add_check_failed_at,
+]
+
+
+async def run_migrations(db: aiosqlite.Connection) -> int:
+    """Применяет миграции, которых ещё нет в базе (по PRAGMA user_version), и возвращает версию схемы."""
+    async with db.execute("PRAGMA user_version") as cursor:
+        version = (await cursor.fetchone())[0]
+    if version > len(MIGRATIONS):
+        raise RuntimeError(f"Схема БД версии {version} новее, чем известно боту ({len(MIGRATIONS)})")
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        # Каждая миграция вместе с новым номером версии — в одной транзакции
+        await db.execute("BEGIN")
+        try:
+            await migration(db)
+            await db.execute(f"PRAGMA user_version = {number}")
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+        logging.info(f"Применена миграция БД {migration.__doc__}")
+    return len(MIGRATIONS)
@@ -1,24 +1,24 @@
 # file: handlers/add_account.py
 
 import logging
+from typing import TYPE_CHECKING
+
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, CallbackQuery
 
-# Импорты Telethon
-from telethon import TelegramClient
-from telethon.sessions import StringSession
-from telethon.errors import (
-    SessionPasswordNeededError,
-    PhoneCodeInvalidError,
-    PasswordHashInvalidError,
-    PhoneNumberUnoccupiedError
-)
-
 from config import API_ID, API_HASH
 from database.db_manager import db_save_account
 from keyboards.inline_kb import get_main_menu_kb
+from userbot_logic.client_pool import create_client
+from userbot_logic.code_listener import code_listener, CODE_LISTENER_ENABLED
+from userbot_logic.login_registry import login_registry
+from userbot_logic.scheduler import scheduler
+
+# Telethon импортируется внутри хендлеров: он нужен только при добавлении аккаунта
+if TYPE_CHECKING:
+    from telethon import TelegramClient
 
 router = Router()
 
@@ -28,6 +28,16 @@ class AddAccount(StatesGroup):
     code = State()
     password = State()
 
+async def _get_login_client(user_id: int, session_string: str | None) -> "TelegramClient":
+    """Возвращает живой клиент входа из реестра или восстанавливает его из строки сессии."""
+    client = login_registry.get(user_id)
+    if client is None:
+        # Реестр пуст (например, бот перезапускался) — переподключаемся по сохранённой сессии
+        client = create_client(session_string, API_ID, API_HASH)
+        await client.connect()
+        login_registry.put(user_id, client)
+    return client
+
 # Этот хендлер теперь сразу запрашивает номер телефона
 @router.callback_query(F.data == "add_account")
 async def cq_add_account_start(query: CallbackQuery, state: FSMContext):
@@ -36,6 +46,8 @@ async def cq_add_account_start(query: CallbackQuery, state: FSMContext):
         "Пожалуйста, введите **номер телефона** в международном формате (например, +79123456789).",
         parse_mode="Markdown"
     )
+    # Бросаем предыдущий незавершённый вход, если он был
+    await login_registry.discard(query.from_user.id)
     # Сразу переходим к состоянию ввода телефона
     await state.set_state(AddAccount.phone)
     await query.answer()
@@ -43,15 +55,17 @@ async def cq_add_account_start(query: CallbackQuery, state: FSMContext):
 
 @router.message(AddAccount.phone)
 async def process_phone(message: Message, state: FSMContext):
+    from telethon.errors import FloodWaitError
+
     await message.answer("⏳ Отправляю код... Пожалуйста, подождите.")
     phone = message.text
 
-    # Создаем клиент Telethon в памяти с новой сессией
-    client = TelegramClient(StringSession(), API_ID, API_HASH)
+    # Создаем клиент Telethon в памяти с новой сессией; FloodWait пережидает планировщик
+    client = create_client(None, API_ID, API_HASH)
 
     try:
         await client.connect()
-        sent_code = await client.send_code_request(phone)
+        sent_code = await scheduler.call((message.from_user.id, phone), API_ID, client.send_code_request, phone)
 
         # Сохраняем в состояние нужные данные для следующего шага
         await state.update_data(
@@ -60,36 +74,47 @@ async def process_phone(message: Message, state: FSMContext):
             session_string=client.session.save()  # Сохраняем сессию как строку
         )
 
+        # Клиент остаётся подключённым до ввода кода; строка сессии — запасной путь после перезапуска
+        login_registry.put(message.from_user.id, client)
+
         await message.answer("Вам был отправлен код в Telegram. Пожалуйста, введите его:")
         await state.set_state(AddAccount.code)
 
+    except FloodWaitError as e:
+        await message.answer(f"⏳ Telegram временно ограничил отправку кодов. Попробуйте через {e.seconds} с.", reply_markup=get_main_menu_kb())
+        await state.clear()
+        if client.is_connected():
+            await client.disconnect()
     except Exception as e:
         logging.error(f"Ошибка на этапе отправки кода: {e}")
         await message.answer(f"❌ Произошла ошибка: {e}\n\nПопробуйте добавить аккаунт еще раз.")
         await state.clear()
-    finally:
-        # Отключаемся и будем переподключаться на следующем шаге, используя сессию
         if client.is_connected():
             await client.disconnect()
 
 
 @router.message(AddAccount.code)
 async def process_code(message: Message, state: FSMContext):
+    from telethon.errors import (
+        SessionPasswordNeededError, PhoneCodeInvalidError, PhoneNumberUnoccupiedError, FloodWaitError
+    )
+
     code = message.text
     data = await state.get_data()
     phone = data['phone']
 
-    # Восстанавливаем клиент из строки сессии
-    client = TelegramClient(StringSession(data.get('session_string')), API_ID, API_HASH)
-
     try:
-        await client.connect()
+        client = await _get_login_client(message.from_user.id, data.get('session_string'))
         # Входим, используя код
-        await client.sign_in(phone, code, phone_code_hash=data['phone_code_hash'])
+        await scheduler.call(
+            (message.from_user.id, phone), API_ID, client.sign_in, phone, code, phone_code_hash=data['phone_code_hash']
+        )
 
         # Если вход успешен без 2FA пароля
         final_session_string = client.session.save()
         await db_save_account(message.from_user.id, phone, API_ID, API_HASH, final_session_string)
+        if CODE_LISTENER_ENABLED:
+            await code_listener.attach(message.from_user.id, phone, API_ID, API_HASH, final_session_string)
 
         await message.answer("✅ Аккаунт успешно добавлен!", reply_markup=get_main_menu_kb())
         await state.clear()
@@ -107,31 +132,36 @@ async def process_code(message: Message, state: FSMContext):
     except PhoneNumberUnoccupiedError:
         await message.answer("Этот номер телефона не зарегистрирован. Начните заново.", reply_markup=get_main_menu_kb())
         await state.clear()
+    except FloodWaitError as e:
+        # Состояние не сбрасываем: код можно ввести повторно после ожидания
+        await message.answer(f"⏳ Telegram временно ограничил вход. Введите код ещё раз через {e.seconds} с.")
     except Exception as e:
         logging.error(f"Ошибка на этапе ввода кода: {e}")
         await message.answer(f"❌ Произошла ошибка: {e}\n\nНачните заново.", reply_markup=get_main_menu_kb())
         await state.clear()
     finally:
-        if client.is_connected():
-            await client.disconnect()
+        # Клиент нужен дальше только для повторного ввода кода или пароля 2FA
+        if await state.get_state() not in (AddAccount.code.state, AddAccount.password.state):
+            await login_registry.discard(message.from_user.id)
 
 
 @router.message(AddAccount.password)
 async def process_password(message: Message, state: FSMContext):
+    from telethon.errors import PasswordHashInvalidError, FloodWaitError
+
     password = message.text
     data = await state.get_data()
     phone = data['phone']
 
-    # Восстанавливаем клиент из строки сессии
-    client = TelegramClient(StringSession(data.get('session_string')), API_ID, API_HASH)
-
     try:
-        await client.connect()
+        client = await _get_login_client(message.from_user.id, data.get('session_string'))
         # Входим, используя пароль
-        await client.sign_in(password=password)
+        await scheduler.call((message.from_user.id, phone), API_ID, client.sign_in, password=password)
 
         final_session_string = client.session.save()
         await db_save_account(message.from_user.id, phone, API_ID, API_HASH, final_session_string)
+        if CODE_LISTENER_ENABLED:
+            await code_listener.attach(message.from_user.id, phone, API_ID, API_HASH, final_session_string)
 
         await message.answer("✅ Аккаунт успешно добавлен!", reply_markup=get_main_menu_kb())
         await state.clear()
@@ -139,10 +169,14 @@ async def process_password(message: Message, state: FSMContext):
     except PasswordHashInvalidError:
         await message.answer("Неверный пароль. Начните заново.", reply_markup=get_main_menu_kb())
         await state.clear()
+    except FloodWaitError as e:
+        # Состояние не сбрасываем: пароль можно ввести повторно после ожидания
+        await message.answer(f"⏳ Telegram временно ограничил вход. Введите пароль ещё раз через {e.seconds} с.")
     except Exception as e:
         logging.error(f"Ошибка на этапе ввода пароля: {e}")
         await message.answer(f"❌ Произошла ошибка: {e}\n\nНачните заново.", reply_markup=get_main_menu_kb())
         await state.clear()
     finally:
-        if client.is_connected():
-            await client.disconnect()
\ No newline at end of file
+        # Клиент нужен дальше, только если пароль предстоит ввести повторно
+        if await state.get_state() != AddAccount.password.state:
+            await login_registry.discard(message.from_user.id)
\ No newline at end of file
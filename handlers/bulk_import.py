@@ -0,0 +1,118 @@
+# file: handlers/bulk_import.py
+
+import html as html_lib
+import logging
+import os
+import time
+
+from aiogram import Bot, Router, F
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
+
+from config import API_ID, API_HASH
+from database.db_manager import db_save_accounts
+from handlers.utils import MAX_REPORT_LENGTH, safe_edit_text
+from keyboards.inline_kb import get_main_menu_kb
+from userbot_logic.concurrency import run_bulk
+from userbot_logic.userbot import resolve_session_phone
+from userbot_logic.session_files import parse_import_file
+from userbot_logic.validator import VALIDATION_TIMEOUT
+from userbot_logic.code_listener import code_listener, CODE_LISTENER_ENABLED
+
+router = Router()
+
+# Сколько сессий проверяется одновременно при массовом импорте
+BULK_IMPORT_CONCURRENCY = int(os.getenv("BULK_IMPORT_CONCURRENCY", "10"))
+# Как часто обновлять сообщение с прогрессом, в секундах
+BULK_IMPORT_EDIT_INTERVAL = 2.0
+
+
+class BulkImport(StatesGroup):
+    file = State()
+
+
+@router.callback_query(F.data == "bulk_import")
+async def cq_bulk_import_start(query: CallbackQuery, state: FSMContext):
+    await query.message.edit_text(
+        "📦 Массовый импорт аккаунтов.\n\n"
+        "Отправьте файл одного из форматов:\n"
+        "• <b>.zip</b> с файлами <code>.session</code> Telethon и/или <code>.txt</code>;\n"
+        "• <b>.txt</b> со строками StringSession, по одной на строку;\n"
+        "• одиночный файл <b>.session</b>.",
+        parse_mode="HTML"
+    )
+    await state.set_state(BulkImport.file)
+    await query.answer()
+
+
+@router.message(BulkImport.file, F.document)
+async def process_import_file(message: Message, state: FSMContext, bot: Bot):
+    await state.clear()
+    document = message.document
+    status_message = await message.answer("⏳ Загружаю файл...")
+
+    try:
+        file = await bot.download(document)
+        items = parse_import_file(document.file_name or "", file.read())
+    except ValueError as e:
+        await status_message.edit_text(f"❌ Не удалось разобрать файл: {e}", reply_markup=get_main_menu_kb())
+        return
+    except Exception as e:
+        logging.error(f"Ошибка при загрузке файла импорта: {e}")
+        await status_message.edit_text(f"❌ Произошла ошибка: {e}", reply_markup=get_main_menu_kb())
+        return
+
+    if not items:
+        await status_message.edit_text("❌ В файле не найдено ни одной сессии.", reply_markup=get_main_menu_kb())
+        return
+
+    total = len(items)
+    # Элементы, которые не удалось разобрать, сразу идут в отчёт; остальные проверяются подключением
+    results = [(name, None, None, error) for name, _, error in items if error]
+    sessions = [(name, session_string) for name, session_string, error in items if not error]
+    last_edit = time.monotonic()
+    async for (name, session_string), phone, error in run_bulk(
+        sessions, lambda item: resolve_session_phone(item[1], API_ID, API_HASH), BULK_IMPORT_CONCURRENCY, VALIDATION_TIMEOUT
+    ):
+        results.append((name, session_string if error is None else None, phone, error))
+        if time.monotonic() - last_edit >= BULK_IMPORT_EDIT_INTERVAL:
+            await safe_edit_text(status_message, f"⏳ Проверка сессий: {len(results)}/{total}...")
+            last_edit = time.monotonic()
+
+    # Сохраняем все валидные сессии одной транзакцией; повторы одного номера пропускаем
+    rows = {}
+    report_lines = []
+    for name, session_string, phone, error in sorted(results, key=lambda r: r[0]):
+        if error:
+            report_lines.append(f"❌ {name}: {error}")
+        elif phone in rows:
+            report_lines.append(f"⚠️ {name}: {phone} уже есть в этом файле")
+        else:
+            rows[phone] = (message.from_user.id, phone, API_ID, API_HASH, session_string)
+            report_lines.append(f"✅ {name}: {phone}")
+
+    if rows:
+        await db_save_accounts(rows.values())
+
+    summary = f"📦 Импорт завершён: добавлено {len(rows)} из {total}."
+    report = "\n".join(report_lines)
+    if len(report) <= MAX_REPORT_LENGTH:
+        await status_message.edit_text(
+            f"<b>{summary}</b>\n\n{html_lib.escape(report)}", parse_mode="HTML", reply_markup=get_main_menu_kb()
+        )
+    else:
+        await status_message.edit_text(summary, reply_markup=get_main_menu_kb())
+        await message.answer_document(
+            BufferedInputFile(report.encode("utf-8"), filename="import_report.txt"),
+            caption="Подробный отчёт об импорте"
+        )
+
+    # Подписка на коды подключает каждый аккаунт — делаем её в фоне, уже после отчёта
+    if rows and CODE_LISTENER_ENABLED:
+        code_listener.attach_in_background(rows.values())
+
+
+@router.message(BulkImport.file)
+async def process_import_not_file(message: Message):
+    await message.answer("Пожалуйста, отправьте файл .zip, .txt или .session.")
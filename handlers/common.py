@@ -1,18 +1,40 @@
 # file: handlers/common.py
+import asyncio
 import os
+import time
+from contextlib import suppress
 from aiogram import Router, F, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from telethon.sessions import StringSession, SQLiteSession
-
-from keyboards.inline_kb import get_main_menu_kb, get_my_accounts_kb, get_account_actions_kb
-from database.db_manager import db_get_user_accounts, db_delete_account, db_get_account_details
-from userbot_logic.userbot import get_account_info, check_session_validity, get_last_service_messages
+from keyboards.inline_kb import (
+    get_main_menu_kb, get_my_accounts_kb, get_account_actions_kb, get_overview_kb,
+    get_cached_accounts_page, cache_accounts_page,
+)
+from database.db_manager import (
+    db_get_user_accounts_details, db_get_user_accounts_page, db_get_accounts_details, db_set_accounts_status,
+    db_get_account_details, get_accounts_version,
+)
+from userbot_logic.userbot import get_account_info, get_last_service_messages
+from userbot_logic.validator import iter_session_validity
+from userbot_logic.status_refresher import is_status_stale
+from userbot_logic.code_listener import code_listener, CODE_LISTENER_ENABLED
+from userbot_logic.session_files import string_to_session_file, build_sessions_archive
+from userbot_logic.overview import get_overview_page
+from userbot_logic.bulk import remove_account
+from handlers.utils import safe_edit_text
 
 router = Router()
 
+# Как часто (в секундах) обновлять клавиатуру по мере поступления результатов проверки
+ACCOUNTS_EDIT_INTERVAL = float(os.getenv("ACCOUNTS_EDIT_INTERVAL", "1.5"))
+# Сколько аккаунтов показывать на одной странице списка
+ACCOUNTS_PAGE_SIZE = int(os.getenv("ACCOUNTS_PAGE_SIZE", "20"))
+
 @router.message(CommandStart())
 async def cmd_start(message: Message):
     await message.answer("👋 Привет! Это бот для управления вашими Telegram-аккаунтами.", reply_markup=get_main_menu_kb())
@@ -22,29 +44,133 @@ async def cq_main_menu(query: CallbackQuery):
     await query.message.edit_text("Главное меню:", reply_markup=get_main_menu_kb())
     await query.answer()
 
+class AccountSearch(StatesGroup):
+    prefix = State()
+
+def _accounts_page_text(prefix: str, accounts: list, checked: list) -> str:
+    # Подсказка об устаревших статусах зависит от текущего времени, поэтому не кэшируется
+    if prefix and not accounts:
+        return f"По запросу «{prefix}» аккаунтов не найдено."
+    text = "Выберите аккаунт для управления:"
+    now = time.time()
+    if any(is_status_stale(last_checked, now) for last_checked in checked):
+        text += "\n\nЧасть статусов устарела — нажмите «🔄 Обновить статусы» для проверки."
+    return text
+
+async def _load_accounts_page(user_id: int, direction: str = "a", cursor: str = "", prefix: str = ""):
+    """Возвращает (текст, [(phone, is_valid)], клавиатура) страницы списка аккаунтов, по возможности из кэша."""
+    key = (user_id, get_accounts_version(user_id), direction, cursor, prefix)
+    page = get_cached_accounts_page(key)
+    if page is not None:
+        accounts, markup, checked = page
+        return _accounts_page_text(prefix, accounts, checked), accounts, markup
+
+    rows, has_more = await db_get_user_accounts_page(
+        user_id, ACCOUNTS_PAGE_SIZE,
+        after=cursor if direction == "a" and cursor else None,
+        before=cursor if direction == "b" and cursor else None,
+        prefix=prefix,
+    )
+    if not rows and cursor:
+        # Страница опустела (аккаунты удалены) — показываем первую
+        return await _load_accounts_page(user_id, prefix=prefix)
+
+    if direction == "b":
+        prev_cursor = rows[0][0] if has_more else None
+        next_cursor = rows[-1][0] if rows else None
+    else:
+        prev_cursor = rows[0][0] if cursor and rows else None
+        next_cursor = rows[-1][0] if has_more else None
+
+    accounts = [(phone, is_valid) for phone, is_valid, _ in rows]
+    checked = [last_checked for _, _, last_checked in rows]
+    markup = get_my_accounts_kb(
+        accounts, page=(direction, cursor), prev_cursor=prev_cursor, next_cursor=next_cursor, prefix=prefix
+    )
+    cache_accounts_page(key, (accounts, markup, checked))
+    return _accounts_page_text(prefix, accounts, checked), accounts, markup
+
+async def _show_accounts_page(query: CallbackQuery, direction: str = "a", cursor: str = "", prefix: str = ""):
+    # Список строится из кэша статусов, без обращений к Telegram
+    text, accounts, markup = await _load_accounts_page(query.from_user.id, direction, cursor, prefix)
+    if not accounts and not prefix:
+        with suppress(TelegramBadRequest):
+            await query.answer("У вас пока нет добавленных аккаунтов.", show_alert=True)
+        await safe_edit_text(query.message, "Главное меню:", reply_markup=get_main_menu_kb())
+        return
+
+    await safe_edit_text(query.message, text, reply_markup=markup)
+    with suppress(TelegramBadRequest):
+        await query.answer()
+
 @router.callback_query(F.data == "my_accounts")
 async def cq_my_accounts(query: CallbackQuery):
-    await query.message.edit_text("⏳ Проверка аккаунтов, пожалуйста, подождите...")
-    
-    phones = await db_get_user_accounts(query.from_user.id)
-    if not phones:
-        await query.answer("У вас пока нет добавленных аккаунтов.", show_alert=True)
-        await query.message.edit_text("Главное меню:", reply_markup=get_main_menu_kb())
-        return
+    await _show_accounts_page(query)
 
-    accounts_with_status = []
-    for phone in phones:
-        details = await db_get_account_details(query.from_user.id, phone)
-        if details:
-            api_id, api_hash, session_string = details
-            is_valid = await check_session_validity(session_string, api_id, api_hash)
-            accounts_with_status.append((phone, is_valid))
-        else:
-            accounts_with_status.append((phone, False))
-
-    await query.message.edit_text("Выберите аккаунт для управления:", reply_markup=get_my_accounts_kb(accounts_with_status))
+@router.callback_query(F.data.startswith("accounts:"))
+async def cq_accounts_page(query: CallbackQuery):
+    _, direction, cursor, prefix = query.data.split(":", 3)
+    await _show_accounts_page(query, direction, cursor, prefix)
+
+@router.callback_query(F.data == "search_accounts")
+async def cq_search_accounts(query: CallbackQuery, state: FSMContext):
+    await query.message.edit_text("🔍 Введите начало номера телефона (например, +7912):")
+    await state.set_state(AccountSearch.prefix)
     await query.answer()
 
+@router.message(AccountSearch.prefix)
+async def process_search_prefix(message: Message, state: FSMContext):
+    # В callback_data помещается ограниченное число символов, поэтому оставляем только цифры и «+»
+    prefix = "".join(ch for ch in (message.text or "") if ch in "+0123456789")[:16]
+    if not prefix:
+        await message.answer("Введите цифры номера, например +7912:")
+        return
+    await state.clear()
+    text, _, markup = await _load_accounts_page(message.from_user.id, prefix=prefix)
+    await message.answer(text, reply_markup=markup)
+
+@router.callback_query(F.data.startswith("refresh_accounts:"))
+async def cq_refresh_accounts(query: CallbackQuery):
+    _, direction, cursor, prefix = query.data.split(":", 3)
+    # Перепроверяем аккаунты текущей страницы
+    _, accounts, _ = await _load_accounts_page(query.from_user.id, direction, cursor, prefix)
+    credentials = await db_get_accounts_details(query.from_user.id, [phone for phone, _ in accounts])
+    if not credentials:
+        await _show_accounts_page(query, direction, cursor, prefix)
+        return
+
+    # Отвечаем сразу, чтобы callback не успел истечь, пока идут проверки
+    with suppress(TelegramBadRequest):
+        await query.answer()
+
+    statuses = {phone: None for phone, _ in accounts}
+    progress_text = "⏳ Проверка аккаунтов: {done}/{total}..."
+    total = len(credentials)
+    done = 0
+    await safe_edit_text(
+        query.message,
+        progress_text.format(done=done, total=total),
+        reply_markup=get_my_accounts_kb(list(statuses.items()), unknown_icon="⏳", page=(direction, cursor), prefix=prefix),
+    )
+
+    # Результаты приходят по мере готовности; клавиатуру обновляем не чаще ACCOUNTS_EDIT_INTERVAL
+    last_edit = time.monotonic()
+    async for phone, is_valid in iter_session_validity(query.from_user.id, credentials):
+        statuses[phone] = is_valid
+        done += 1
+        if done < total and time.monotonic() - last_edit >= ACCOUNTS_EDIT_INTERVAL:
+            await safe_edit_text(
+                query.message,
+                progress_text.format(done=done, total=total),
+                reply_markup=get_my_accounts_kb(list(statuses.items()), unknown_icon="⏳", page=(direction, cursor), prefix=prefix),
+            )
+            last_edit = time.monotonic()
+
+    await db_set_accounts_status(
+        query.from_user.id, [(phone, is_valid) for phone, is_valid in statuses.items() if is_valid is not None], time.time()
+    )
+    await _show_accounts_page(query, direction, cursor, prefix)
+
 @router.callback_query(F.data.startswith("select_account:"))
 async def cq_select_account(query: CallbackQuery):
     phone = query.data.split(":")[1]
@@ -62,10 +188,22 @@ async def cq_show_info(query: CallbackQuery):
     # --- ИЗМЕНЕНИЕ ---
     await query.message.edit_text(info_text, reply_markup=builder.as_markup(), parse_mode="HTML")
 
+@router.callback_query(F.data.startswith("overview:") | F.data.startswith("overview_refresh:"))
+async def cq_accounts_overview(query: CallbackQuery):
+    action, page = query.data.split(":")
+    # Сводка собирается из кэша; при его отсутствии — параллельным опросом всех аккаунтов
+    with suppress(TelegramBadRequest):
+        await query.answer("Собираю сводку, пожалуйста, подождите...", show_alert=False)
+
+    text, page, total_pages = await get_overview_page(
+        query.from_user.id, int(page), force=action == "overview_refresh"
+    )
+    await safe_edit_text(query.message, text, reply_markup=get_overview_kb(page, total_pages), parse_mode="HTML")
+
 @router.callback_query(F.data.startswith("delete:"))
 async def cq_delete_account(query: CallbackQuery):
     phone = query.data.split(":")[1]
-    await db_delete_account(query.from_user.id, phone)
+    await remove_account(query.from_user.id, phone)
     await query.answer("Аккаунт успешно удален!", show_alert=True)
     await cq_my_accounts(query)
 
@@ -80,31 +218,37 @@ async def cq_export_session(query: CallbackQuery):
         return
 
     _, _, session_string = details
-    
-    string_session = StringSession(session_string)
-    session_filename = f"{query.from_user.id}_{phone}.session"
-    sqlite_session = SQLiteSession(session_filename)
-    
-    sqlite_session.set_dc(string_session.dc_id, string_session.server_address, string_session.port)
-    sqlite_session.auth_key = string_session.auth_key
-    
-    sqlite_session.save()
-    sqlite_session.close()
 
-    try:
-        document = FSInputFile(session_filename)
-        # --- ИЗМЕНЕНИЕ ---
-        await query.message.answer_document(document, caption=f"Файл сессии для аккаунта <code>{phone}</code>", parse_mode="HTML")
-    finally:
-        if os.path.exists(session_filename):
-            os.remove(session_filename)
+    # Файл сессии собирается в памяти и отправляется без записи на диск
+    session_file = await asyncio.to_thread(string_to_session_file, session_string)
+    document = BufferedInputFile(session_file, filename=f"{phone}.session")
+    await query.message.answer_document(document, caption=f"Файл сессии для аккаунта <code>{phone}</code>", parse_mode="HTML")
+
+@router.callback_query(F.data == "export_all")
+async def cq_export_all_sessions(query: CallbackQuery):
+    accounts = await db_get_user_accounts_details(query.from_user.id)
+    if not accounts:
+        await query.answer("У вас пока нет добавленных аккаунтов.", show_alert=True)
+        return
+    await query.answer(f"Собираю архив из {len(accounts)} сессий...", show_alert=False)
+
+    archive = await asyncio.to_thread(
+        build_sessions_archive, [(phone, session_string) for phone, _, _, session_string in accounts]
+    )
+    document = BufferedInputFile(archive, filename=f"sessions_{query.from_user.id}.zip")
+    await query.message.answer_document(document, caption=f"Файлы сессий всех аккаунтов: {len(accounts)} шт.")
 
 @router.callback_query(F.data.startswith("show_codes:"))
 async def cq_show_service_codes(query: CallbackQuery):
     phone = query.data.split(":")[1]
     await query.answer("Загружаю сообщения от Telegram...", show_alert=False)
 
-    messages_text = await get_last_service_messages(query.from_user.id, phone)
+    messages_text = None
+    if CODE_LISTENER_ENABLED:
+        # В режиме слушателя коды уже лежат в памяти
+        messages_text = await code_listener.get_or_attach_codes(query.from_user.id, phone)
+    if messages_text is None:
+        messages_text = await get_last_service_messages(query.from_user.id, phone)
 
     builder = InlineKeyboardBuilder()
     builder.row(types.InlineKeyboardButton(text="⬅️ Назад", callback_data=f"select_account:{phone}"))
@@ -0,0 +1,203 @@
+# file: handlers/groups.py
+
+import asyncio
+import html as html_lib
+import os
+import re
+import time
+from contextlib import suppress
+
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
+
+from database.db_manager import (
+    db_get_account_labels, db_set_account_labels, db_get_user_labels, db_get_accounts_by_label, db_set_accounts_status,
+)
+from keyboards.inline_kb import get_account_actions_kb, get_groups_kb, get_group_actions_kb, ALL_ACCOUNTS_LABEL
+from handlers.utils import MAX_REPORT_LENGTH, safe_edit_text
+from userbot_logic.bulk import BULK_CONCURRENCY, BULK_TIMEOUT, probe_account, fetch_latest_code, remove_if_revoked
+from userbot_logic.concurrency import run_bulk
+from userbot_logic.session_files import build_sessions_archive
+
+router = Router()
+
+# Как часто обновлять сообщение с прогрессом группового действия, в секундах
+BULK_EDIT_INTERVAL = float(os.getenv("BULK_EDIT_INTERVAL", "2"))
+# Ограничения на метки: callback_data кнопок группы не длиннее 64 байт
+MAX_LABELS = 10
+MAX_LABEL_LENGTH = 20
+
+# Групповые действия, выполняемые пулом воркеров: название для прогресса и обработчик одного аккаунта
+BULK_ACTIONS = {
+    "validate": ("Проверка сессий", probe_account),
+    "codes": ("Получение кодов", fetch_latest_code),
+    "revoked": ("Удаление аннулированных", remove_if_revoked),
+}
+
+
+class AccountLabels(StatesGroup):
+    labels = State()
+
+
+def _parse_labels(text: str) -> list[str]:
+    """Разбирает метки, разделённые запятыми или пробелами: без повторов, только буквы, цифры, «_» и «-»."""
+    labels = []
+    for raw in re.split(r"[,\s]+", text.lower()):
+        label = re.sub(r"[^\w-]", "", raw)[:MAX_LABEL_LENGTH]
+        if label and label not in labels:
+            labels.append(label)
+    return labels[:MAX_LABELS]
+
+
+def _group_title(label: str) -> str:
+    return "все аккаунты" if label == ALL_ACCOUNTS_LABEL else f"группа «{html_lib.escape(label)}»"
+
+
+@router.callback_query(F.data.startswith("labels:"))
+async def cq_account_labels(query: CallbackQuery, state: FSMContext):
+    phone = query.data.split(":")[1]
+    labels = await db_get_account_labels(query.from_user.id, phone)
+    current = ", ".join(labels) if labels else "нет"
+    await query.message.edit_text(
+        f"🏷 Метки аккаунта <code>{phone}</code>: {html_lib.escape(current)}\n\n"
+        "Отправьте новые метки через запятую (например, <code>farm, ru</code>) или «-», чтобы убрать все.",
+        parse_mode="HTML"
+    )
+    await state.set_state(AccountLabels.labels)
+    await state.update_data(phone=phone)
+    await query.answer()
+
+
+@router.message(AccountLabels.labels)
+async def process_account_labels(message: Message, state: FSMContext):
+    data = await state.get_data()
+    phone = data["phone"]
+    labels = [] if (message.text or "").strip() == "-" else _parse_labels(message.text or "")
+    if not labels and (message.text or "").strip() != "-":
+        await message.answer("Не удалось разобрать метки. Используйте буквы и цифры, например: farm, ru")
+        return
+    await state.clear()
+    await db_set_account_labels(message.from_user.id, phone, labels)
+    saved = ", ".join(labels) if labels else "нет"
+    await message.answer(
+        f"✅ Метки аккаунта {phone}: {saved}\n\nДействия для аккаунта {phone}:", reply_markup=get_account_actions_kb(phone)
+    )
+
+
+@router.callback_query(F.data == "groups")
+async def cq_groups(query: CallbackQuery):
+    labels = await db_get_user_labels(query.from_user.id)
+    text = "🏷 Выберите группу для массовых действий:"
+    if not labels:
+        text += "\n\nГрупп пока нет: назначьте метки аккаунтам в меню аккаунта («🏷 Метки»)."
+    await safe_edit_text(query.message, text, reply_markup=get_groups_kb(labels))
+    await query.answer()
+
+
+@router.callback_query(F.data.startswith("group:"))
+async def cq_group(query: CallbackQuery):
+    label = query.data.split(":", 1)[1]
+    await safe_edit_text(
+        query.message, f"🏷 {_group_title(label).capitalize()}: выберите действие.",
+        reply_markup=get_group_actions_kb(label), parse_mode="HTML"
+    )
+    await query.answer()
+
+
+def _build_report(action: str, results: list) -> tuple[str, list[str]]:
+    """Собирает итог группового действия: строку-сводку и строки отчёта в HTML."""
+    lines = []
+    errors = 0
+    positive = 0
+    for phone, result, error in sorted(results, key=lambda r: r[0]):
+        phone_html = f"<code>{html_lib.escape(phone)}</code>"
+        if error is not None:
+            errors += 1
+            lines.append(f"⚠️ {phone_html} — ошибка: {html_lib.escape(error)}")
+        elif action == "validate":
+            positive += bool(result)
+            lines.append(f"{'✅' if result else '❌'} {phone_html}")
+        elif action == "codes":
+            if result is None:
+                lines.append(f"➖ {phone_html} — кодов нет")
+            else:
+                positive += 1
+                date, code_html = result
+                lines.append(f"✉️ {phone_html} <code>{date.strftime('%H:%M:%S')}</code> — {code_html}")
+        elif result:
+            positive += 1
+            lines.append(f"🗑 {phone_html} — удалён")
+
+    total = len(results)
+    if action == "validate":
+        summary = f"Проверено {total}: действительны {positive}, аннулированы {total - positive - errors}"
+    elif action == "codes":
+        summary = f"Коды получены для {positive} из {total}"
+    else:
+        summary = f"Удалено аннулированных: {positive} из {total}"
+    if errors:
+        summary += f", ошибок: {errors}"
+    return summary, lines
+
+
+@router.callback_query(F.data.startswith("bulk:"))
+async def cq_bulk_action(query: CallbackQuery):
+    _, action, label = query.data.split(":", 2)
+    user_id = query.from_user.id
+    accounts = await db_get_accounts_by_label(user_id, None if label == ALL_ACCOUNTS_LABEL else label)
+    if not accounts:
+        await query.answer("В группе нет аккаунтов.", show_alert=True)
+        return
+    # Отвечаем сразу, чтобы callback не успел истечь, пока идёт обработка
+    with suppress(TelegramBadRequest):
+        await query.answer()
+
+    title = _group_title(label)
+    if action == "export":
+        archive = await asyncio.to_thread(
+            build_sessions_archive, [(phone, session_string) for phone, _, _, session_string in accounts]
+        )
+        document = BufferedInputFile(archive, filename=f"sessions_{'all' if label == ALL_ACCOUNTS_LABEL else label}.zip")
+        await query.message.answer_document(document, caption=f"Файлы сессий ({title}): {len(accounts)} шт.", parse_mode="HTML")
+        return
+
+    action_title, worker = BULK_ACTIONS[action]
+    total = len(accounts)
+    progress_text = f"⏳ {action_title} — {title}: {{done}}/{total}..."
+    await safe_edit_text(query.message, progress_text.format(done=0), parse_mode="HTML")
+
+    # Аккаунты обрабатываются пулом воркеров; прогресс обновляется не чаще BULK_EDIT_INTERVAL
+    results = []
+    last_edit = time.monotonic()
+    async for account, result, error in run_bulk(
+        accounts, lambda account: worker(user_id, account), BULK_CONCURRENCY, BULK_TIMEOUT
+    ):
+        results.append((account[0], result, error))
+        if len(results) < total and time.monotonic() - last_edit >= BULK_EDIT_INTERVAL:
+            await safe_edit_text(query.message, progress_text.format(done=len(results)), parse_mode="HTML")
+            last_edit = time.monotonic()
+
+    if action == "validate":
+        await db_set_accounts_status(
+            user_id, [(phone, is_valid) for phone, is_valid, error in results if error is None], time.time()
+        )
+
+    summary, lines = _build_report(action, results)
+    header = f"<b>{action_title} — {title}</b>\n{summary}."
+    report = "\n".join(lines)
+    if len(report) <= MAX_REPORT_LENGTH:
+        await safe_edit_text(
+            query.message, f"{header}\n\n{report}" if report else header,
+            parse_mode="HTML", reply_markup=get_group_actions_kb(label)
+        )
+    else:
+        await safe_edit_text(query.message, header, parse_mode="HTML", reply_markup=get_group_actions_kb(label))
+        # В файл отчёт идёт обычным текстом
+        plain_report = html_lib.unescape(re.sub(r"<[^>]+>", "", report))
+        await query.message.answer_document(
+            BufferedInputFile(plain_report.encode("utf-8"), filename=f"{action}_report.txt"),
+            caption="Подробный отчёт"
+        )
@@ -0,0 +1,23 @@
+# file: handlers/stats.py
+
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from config import OWNER_ID
+from monitoring.metrics import render_summary
+from userbot_logic.scheduler import scheduler
+
+router = Router()
+
+
+@router.message(Command("stats"), F.from_user.id == OWNER_ID)
+async def cmd_stats(message: Message):
+    queue = scheduler.snapshot()
+    text = (
+        render_summary()
+        + "\n\n<b>Планировщик запросов:</b>\n"
+        f"вызовов: {queue['calls']}, FloodWait: {queue['flood_waits']}, "
+        f"среднее ожидание: {queue['avg_wait'] * 1000:.0f} мс, максимум: {queue['max_wait'] * 1000:.0f} мс"
+    )
+    await message.answer(text, parse_mode="HTML")
@@ -0,0 +1,15 @@
+# file: handlers/utils.py
+
+from contextlib import suppress
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+# Отчёт длиннее этого отправляется файлом (лимит сообщения Telegram — 4096 символов)
+MAX_REPORT_LENGTH = 3500
+
+
+async def safe_edit_text(message: Message, text: str, **kwargs):
+    """Редактирует сообщение, игнорируя ошибку «message is not modified»."""
+    with suppress(TelegramBadRequest):
+        await message.edit_text(text, **kwargs)
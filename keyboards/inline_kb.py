@@ -2,28 +2,114 @@
 
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
 
 def get_main_menu_kb():
     builder = InlineKeyboardBuilder()
     builder.row(InlineKeyboardButton(text="➕ Добавить аккаунт", callback_data="add_account"))
+    builder.row(InlineKeyboardButton(text="📦 Массовый импорт", callback_data="bulk_import"))
     builder.row(InlineKeyboardButton(text="📂 Мои аккаунты", callback_data="my_accounts"))
+    builder.row(InlineKeyboardButton(text="🏷 Группы", callback_data="groups"))
     return builder.as_markup()
 
-def get_my_accounts_kb(accounts: List[Tuple[str, bool]]):
+def get_accounts_page_data(action: str, direction: str = "a", cursor: str = "", prefix: str = "") -> str:
+    """Собирает callback_data для страницы списка аккаунтов: direction — 'a' (после cursor) или 'b' (до cursor)."""
+    return f"{action}:{direction}:{cursor}:{prefix}"
+
+
+def get_my_accounts_kb(
+    accounts: List[Tuple[str, Optional[bool]]],
+    unknown_icon: str = "❔",
+    page: Tuple[str, str] = ("a", ""),
+    prev_cursor: Optional[str] = None,
+    next_cursor: Optional[str] = None,
+    prefix: str = "",
+):
     builder = InlineKeyboardBuilder()
     for phone, is_valid in accounts:
-        status_icon = "✅" if is_valid else "❌"
+        # None означает, что статус неизвестен (ещё не проверялся или проверка идёт)
+        status_icon = unknown_icon if is_valid is None else ("✅" if is_valid else "❌")
         builder.row(InlineKeyboardButton(text=f"{status_icon} {phone}", callback_data=f"select_account:{phone}"))
+
+    navigation = []
+    if prev_cursor is not None:
+        navigation.append(InlineKeyboardButton(text="◀️", callback_data=get_accounts_page_data("accounts", "b", prev_cursor, prefix)))
+    if next_cursor is not None:
+        navigation.append(InlineKeyboardButton(text="▶️", callback_data=get_accounts_page_data("accounts", "a", next_cursor, prefix)))
+    if navigation:
+        builder.row(*navigation)
+
+    if prefix:
+        builder.row(InlineKeyboardButton(text=f"✖️ Сбросить поиск «{prefix}»", callback_data=get_accounts_page_data("accounts")))
+    else:
+        builder.row(InlineKeyboardButton(text="🔍 Поиск по номеру", callback_data="search_accounts"))
+    builder.row(InlineKeyboardButton(text="🔄 Обновить статусы", callback_data=get_accounts_page_data("refresh_accounts", *page, prefix)))
+    builder.row(InlineKeyboardButton(text="📊 Сводка по всем", callback_data="overview:0"))
+    builder.row(InlineKeyboardButton(text="🗂 Выгрузить все сессии", callback_data="export_all"))
     builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="main_menu"))
     return builder.as_markup()
 
+
+# Собранные страницы списка аккаунтов (LRU); в ключ входит версия списка, поэтому
+# после добавления, удаления или перепроверки аккаунтов старые страницы просто перестают находиться
+_accounts_pages_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+ACCOUNTS_PAGES_CACHE_SIZE = 512
+
+
+def get_cached_accounts_page(key: tuple) -> Optional[Any]:
+    page = _accounts_pages_cache.get(key)
+    if page is not None:
+        _accounts_pages_cache.move_to_end(key)
+    return page
+
+
+def cache_accounts_page(key: tuple, page: Any):
+    _accounts_pages_cache[key] = page
+    _accounts_pages_cache.move_to_end(key)
+    while len(_accounts_pages_cache) > ACCOUNTS_PAGES_CACHE_SIZE:
+        _accounts_pages_cache.popitem(last=False)
+
 def get_account_actions_kb(phone: str):
     builder = InlineKeyboardBuilder()
     builder.row(InlineKeyboardButton(text="ℹ️ Информация", callback_data=f"info:{phone}"))
     # --- Новая кнопка ---
     builder.row(InlineKeyboardButton(text="✉️ Показать коды", callback_data=f"show_codes:{phone}"))
     builder.row(InlineKeyboardButton(text="📥 Выдать файл сессии", callback_data=f"export:{phone}"))
+    builder.row(InlineKeyboardButton(text="🏷 Метки", callback_data=f"labels:{phone}"))
     builder.row(InlineKeyboardButton(text="❌ Удалить аккаунт", callback_data=f"delete:{phone}"))
     builder.row(InlineKeyboardButton(text="⬅️ Назад к списку", callback_data="my_accounts"))
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+def get_overview_kb(page: int, total_pages: int):
+    builder = InlineKeyboardBuilder()
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(text="◀️", callback_data=f"overview:{page - 1}"))
+    navigation.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data=f"overview:{page}"))
+    if page < total_pages - 1:
+        navigation.append(InlineKeyboardButton(text="▶️", callback_data=f"overview:{page + 1}"))
+    builder.row(*navigation)
+    builder.row(InlineKeyboardButton(text="🔄 Обновить", callback_data=f"overview_refresh:{page}"))
+    builder.row(InlineKeyboardButton(text="⬅️ Назад к списку", callback_data="my_accounts"))
+    return builder.as_markup()
+
+# Метка-заглушка для действий над всеми аккаунтами пользователя
+ALL_ACCOUNTS_LABEL = "*"
+
+def get_groups_kb(labels: List[Tuple[str, int]]):
+    builder = InlineKeyboardBuilder()
+    for label, count in labels:
+        builder.row(InlineKeyboardButton(text=f"🏷 {label} ({count})", callback_data=f"group:{label}"))
+    builder.row(InlineKeyboardButton(text="🌐 Все аккаунты", callback_data=f"group:{ALL_ACCOUNTS_LABEL}"))
+    builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="main_menu"))
+    return builder.as_markup()
+
+def get_group_actions_kb(label: str):
+    builder = InlineKeyboardBuilder()
+    builder.row(InlineKeyboardButton(text="🔄 Проверить сессии", callback_data=f"bulk:validate:{label}"))
+    builder.row(InlineKeyboardButton(text="✉️ Последние коды", callback_data=f"bulk:codes:{label}"))
+    builder.row(InlineKeyboardButton(text="🗂 Выгрузить сессии", callback_data=f"bulk:export:{label}"))
+    builder.row(InlineKeyboardButton(text="🗑 Удалить аннулированные", callback_data=f"bulk:revoked:{label}"))
+    builder.row(InlineKeyboardButton(text="⬅️ Назад к группам", callback_data="groups"))
+    return builder.as_markup()
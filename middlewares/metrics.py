@@ -0,0 +1,30 @@
+# file: middlewares/metrics.py
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from monitoring.metrics import observe_call
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Записывает задержку, число вызовов и ошибки каждого хендлера."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(handler_object.callback, "__name__", "unknown") if handler_object else "unknown"
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception as e:
+            observe_call("handler", name, started, e)
+            raise
+        observe_call("handler", name, started)
+        return result
@@ -0,0 +1,30 @@
+# file: middlewares/startup.py
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from monitoring.startup import mark, report
+
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """Отмечает обработку первого апдейта и выводит профиль запуска."""
+
+    def __init__(self):
+        self._done = False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self._done:
+            return await handler(event, data)
+        self._done = True
+        try:
+            return await handler(event, data)
+        finally:
+            mark("первый апдейт")
+            report()
@@ -0,0 +1,24 @@
+# file: monitoring/endpoint.py
+
+from aiohttp import web
+
+from monitoring.metrics import render_prometheus
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    """Отдаёт метрики в текстовом формате Prometheus."""
+    return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+def add_metrics_route(app: web.Application, path: str = "/metrics"):
+    app.router.add_get(path, metrics_view)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднимает отдельный aiohttp-сервер с эндпоинтом /metrics (не на публичном порту вебхука)."""
+    app = web.Application()
+    add_metrics_route(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
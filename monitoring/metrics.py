@@ -0,0 +1,210 @@
+# file: monitoring/metrics.py
+
+import bisect
+import functools
+import math
+import time
+from typing import Any, Callable, Dict, Tuple
+
+# Границы корзин гистограмм задержек, в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        f'{name}="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in key
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    """Монотонно растущий счётчик с метками."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def total(self, **labels: Any) -> float:
+        """Сумма по всем сериям, метки которых содержат указанные."""
+        wanted = set(_label_key(labels))
+        return sum(value for key, value in self._values.items() if wanted <= set(key))
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, key, value
+
+
+class Gauge:
+    """Текущее значение, вычисляемое функцией в момент чтения метрик."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self._read = read
+
+    def value(self) -> float:
+        return float(self._read())
+
+    def samples(self):
+        yield self.name, (), self.value()
+
+
+class Histogram:
+    """Гистограмма (например, задержек) с корзинами фиксированных границ."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # На каждую комбинацию меток: [счётчики корзин (+ корзина +Inf), сумма, количество]
+        self._series: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = _label_key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def series(self) -> Dict[LabelKey, list]:
+        return self._series
+
+    def quantile(self, q: float, key: LabelKey) -> float:
+        """Оценивает квантиль по корзинам (верхняя граница корзины, куда попадает квантиль)."""
+        counts, _, total = self._series[key]
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+    def samples(self):
+        for key, (counts, total_sum, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                yield f"{self.name}_bucket", key + (("le", le),), cumulative
+            yield f"{self.name}_sum", key, total_sum
+            yield f"{self.name}_count", key, total
+
+
+_registry: Dict[str, Any] = {}
+
+
+def _register(metric):
+    existing = _registry.get(metric.name)
+    if existing is not None:
+        return existing
+    _registry[metric.name] = metric
+    return metric
+
+
+def counter(name: str, documentation: str) -> Counter:
+    return _register(Counter(name, documentation))
+
+
+def histogram(name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, documentation, buckets))
+
+
+def gauge(name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+    """Регистрирует gauge; при повторной регистрации функция чтения заменяется."""
+    metric = _registry.get(name)
+    if isinstance(metric, Gauge):
+        metric._read = read
+        return metric
+    return _register(Gauge(name, documentation, read))
+
+
+CALLS = counter("userbot_calls_total", "Число вызовов по типу операции")
+ERRORS = counter("userbot_errors_total", "Число ошибок по типу операции и исключения")
+LATENCY = histogram("userbot_latency_seconds", "Задержка операций, секунды")
+
+
+def observe_call(kind: str, name: str, started: float, error: BaseException | None = None):
+    """Записывает задержку, вызов и (если была) ошибку операции kind/name."""
+    LATENCY.observe(time.perf_counter() - started, kind=kind, name=name)
+    CALLS.inc(kind=kind, name=name)
+    if error is not None:
+        ERRORS.inc(kind=kind, name=name, error=type(error).__name__)
+
+
+def timed(kind: str, name: str | None = None):
+    """Декоратор для async-функций: задержка, число вызовов и ошибки по типу исключения."""
+    def decorator(func):
+        metric_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                observe_call(kind, metric_name, started, e)
+                raise
+            observe_call(kind, metric_name, started)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def render_prometheus() -> str:
+    """Возвращает все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in _registry.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, key, value in metric.samples():
+            lines.append(f"{sample_name}{_format_labels(key)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def render_summary() -> str:
+    """Возвращает краткую HTML-сводку метрик для команды /stats."""
+    lines = ["<b>📈 Статистика</b>", ""]
+    for metric in _registry.values():
+        if isinstance(metric, Gauge):
+            lines.append(f"<b>{metric.name}:</b> {metric.value():g}")
+
+    series = sorted(LATENCY.series().items(), key=lambda item: item[1][2], reverse=True)
+    if series:
+        lines += ["", "<b>Задержки (вызовы, среднее, p50, p99):</b>"]
+    for key, (_, total_sum, total) in series[:25]:
+        labels = dict(key)
+        errors = ERRORS.total(kind=labels["kind"], name=labels["name"])
+        lines.append(
+            f"<code>{labels['kind']}/{labels['name']}</code>: {total}, "
+            f"{total_sum / total * 1000:.0f} мс, "
+            f"≤{LATENCY.quantile(0.5, key) * 1000:.0f} мс, ≤{LATENCY.quantile(0.99, key) * 1000:.0f} мс"
+            + (f", ошибок: {errors:g}" if errors else "")
+        )
+    return "\n".join(lines)
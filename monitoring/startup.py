@@ -0,0 +1,45 @@
+# file: monitoring/startup.py
+
+import logging
+import os
+import sys
+import time
+
+# 1 — записать в лог длительность и память каждой фазы запуска вплоть до первого обработанного апдейта
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+# Тяжёлые зависимости, которые должны загружаться при первом использовании, а не при запуске
+LAZY_MODULES = ("telethon",)
+
+# Точка отсчёта — импорт этого модуля (app.py импортирует его первым)
+_started = time.perf_counter()
+# (фаза, секунд от старта, RSS в МБ)
+_phases: list[tuple[str, float, float | None]] = []
+
+
+def _rss_mb() -> float | None:
+    """Текущий RSS процесса в МБ (только Linux; иначе None)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def mark(phase: str):
+    """Отмечает завершение фазы запуска."""
+    if STARTUP_PROFILE:
+        _phases.append((phase, time.perf_counter() - _started, _rss_mb()))
+
+
+def report():
+    """Пишет в лог фазы запуска: длительность, время от старта, RSS и загруженные тяжёлые модули."""
+    if not STARTUP_PROFILE:
+        return
+    previous = 0.0
+    for phase, elapsed, rss in _phases:
+        rss_text = f", RSS {rss:.1f} МБ" if rss is not None else ""
+        logging.info(f"Запуск: {phase} — {(elapsed - previous) * 1000:.0f} мс (от старта {elapsed:.2f} с{rss_text})")
+        previous = elapsed
+    loaded = [name for name in LAZY_MODULES if name in sys.modules]
+    logging.info(f"Запуск: загружены ленивые модули: {', '.join(loaded) if loaded else 'нет'}")
@@ -0,0 +1,108 @@
+# file: tests/conftest.py
+
+import os
+import sys
+import tempfile
+import types
+from types import SimpleNamespace
+
+import pytest
+
+# Тесты запускаются из корня проекта: python -m pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Настоящий config.py с токенами в репозиторий не входит — подменяем его, а базу кладём во временную папку
+_tmp_dir = tempfile.mkdtemp(prefix="userbot_tests_")
+_config = types.ModuleType("config")
+_config.BOT_TOKEN = "123456:TEST"
+_config.OWNER_ID = 1
+_config.DB_NAME = os.path.join(_tmp_dir, "test.db")
+_config.API_ID = 1
+_config.API_HASH = "test"
+sys.modules["config"] = _config
+
+os.environ.setdefault("CODE_LISTENER", "0")
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Отдельная база на каждый тест, чтобы данные не перетекали между ними."""
+    from database import db_manager
+
+    path = str(tmp_path / "test.db")
+    monkeypatch.setattr(db_manager, "DB_NAME", path)
+    return path
+
+
+class FakeTelethonClient:
+    """Клиент без сети, ведущий себя как TelegramClient в тех местах, где важны аннулированные и недоступные сессии."""
+
+    # Строки сессий, аннулированных на стороне Telegram
+    revoked: set[str] = set()
+    # Строки сессий, запросы которых падают с сетевой ошибкой
+    failing: set[str] = set()
+
+    def __init__(self, session_string: str | None, api_id: int, api_hash: str):
+        self.session_string = session_string
+        self._connected = False
+        self._authorized: bool | None = None
+
+    def _request(self):
+        from telethon.errors import AuthKeyUnregisteredError
+
+        if self.session_string in self.failing:
+            raise ConnectionError("fake connection error")
+        if self.session_string in self.revoked:
+            raise AuthKeyUnregisteredError(request=None)
+
+    async def connect(self):
+        self._connected = True
+
+    async def disconnect(self):
+        self._connected = False
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def is_user_authorized(self) -> bool:
+        # Telethon запоминает первый ответ на всё время жизни клиента
+        if self._authorized is None:
+            self._authorized = self.session_string not in self.revoked
+        return self._authorized
+
+    async def get_me(self):
+        from telethon.errors import UnauthorizedError
+
+        # Telethon перехватывает UnauthorizedError внутри get_me() и возвращает None
+        try:
+            self._request()
+        except UnauthorizedError:
+            return None
+        return SimpleNamespace(id=42, phone="79990000000", first_name="Test", last_name=None, username="test", premium=False)
+
+    async def get_messages(self, entity, limit: int = 1):
+        self._request()
+        return []
+
+    async def __call__(self, request):
+        self._request()
+        return SimpleNamespace()
+
+    def remove_event_handler(self, callback, event=None):
+        pass
+
+
+@pytest.fixture
+def fake_telegram(db_path, monkeypatch):
+    """Подменяет клиенты Telethon в пуле на FakeTelethonClient и сбрасывает лимиты планировщика."""
+    from userbot_logic import client_pool
+    from userbot_logic.scheduler import scheduler
+
+    monkeypatch.setattr(client_pool, "create_client", FakeTelethonClient)
+    monkeypatch.setattr(FakeTelethonClient, "revoked", set())
+    monkeypatch.setattr(FakeTelethonClient, "failing", set())
+    # Лимиты запросов общие на процесс: каждый тест начинает с полных корзин
+    monkeypatch.setattr(scheduler, "_account_buckets", {})
+    monkeypatch.setattr(scheduler, "_api_id_buckets", {})
+    monkeypatch.setattr(scheduler, "_flood_until", {})
+    return FakeTelethonClient
@@ -0,0 +1,149 @@
+# file: tests/test_fsm_storage.py
+
+import asyncio
+import json
+
+import aiosqlite
+from aiogram.fsm.storage.base import StorageKey
+from cryptography.fernet import Fernet
+
+from database import crypto
+from database.db_manager import db_close, db_start
+from database.fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=123456, chat_id=42, user_id=42)
+
+
+async def _rows(db_path: str) -> list[tuple[str, str | None, str]]:
+    async with aiosqlite.connect(db_path) as db:
+        async with db.execute("SELECT key, state, data FROM fsm_states") as cursor:
+            return await cursor.fetchall()
+
+
+def test_state_survives_restart(db_path):
+    async def run():
+        await db_start()
+        try:
+            storage = SQLiteStorage(flush_interval=60)
+            await storage.start()
+            await storage.set_state(KEY, "Form:phone")
+            await storage.set_data(KEY, {"phone": "+79990000000"})
+            await storage.close()
+
+            restarted = SQLiteStorage(flush_interval=60)
+            await restarted.start()
+            assert await restarted.get_state(KEY) == "Form:phone"
+            assert await restarted.get_data(KEY) == {"phone": "+79990000000"}
+            await restarted.close()
+        finally:
+            await db_close()
+
+    asyncio.run(run())
+
+
+def test_changes_after_first_close_are_flushed(db_path):
+    async def run():
+        await db_start()
+        try:
+            storage = SQLiteStorage(flush_interval=60)
+            await storage.start()
+            # Диспетчер закрывает хранилище раньше, чем завершаются апдейты
+            await storage.close()
+            await storage.set_data(KEY, {"step": 2})
+            await storage.close()
+            assert len(await _rows(db_path)) == 1
+        finally:
+            await db_close()
+
+    asyncio.run(run())
+
+
+def test_expired_state_is_dropped_on_read(db_path):
+    async def run():
+        await db_start()
+        try:
+            storage = SQLiteStorage(ttl=0.1, flush_interval=60)
+            await storage.start()
+            await storage.set_state(KEY, "Form:code")
+            await storage.flush()
+            assert len(await _rows(db_path)) == 1
+
+            await asyncio.sleep(0.2)
+            assert await storage.get_state(KEY) is None
+            await storage.flush()
+            assert await _rows(db_path) == []
+            await storage.close()
+        finally:
+            await db_close()
+
+    asyncio.run(run())
+
+
+def test_expired_state_is_removed_by_sweep(db_path):
+    async def run():
+        await db_start()
+        try:
+            storage = SQLiteStorage(ttl=0.5, flush_interval=0.05)
+            await storage.start()
+            await storage.set_state(KEY, "Form:code")
+            await asyncio.sleep(0.2)
+            assert len(await _rows(db_path)) == 1
+
+            # Без единого чтения: фоновый сброс сам находит брошенное состояние
+            await asyncio.sleep(0.6)
+            assert len(storage) == 0
+            assert await _rows(db_path) == []
+            await storage.close()
+        finally:
+            await db_close()
+
+    asyncio.run(run())
+
+
+def test_clearing_state_deletes_row(db_path):
+    async def run():
+        await db_start()
+        try:
+            storage = SQLiteStorage(flush_interval=60)
+            await storage.start()
+            await storage.set_state(KEY, "Form:phone")
+            await storage.set_data(KEY, {"phone": "+79990000000"})
+            await storage.flush()
+            assert len(await _rows(db_path)) == 1
+
+            # Так очищает состояние FSMContext.clear()
+            await storage.set_state(KEY, None)
+            await storage.set_data(KEY, {})
+            await storage.flush()
+            assert await _rows(db_path) == []
+            await storage.close()
+        finally:
+            await db_close()
+
+    asyncio.run(run())
+
+
+def test_data_is_encrypted_with_key(db_path, monkeypatch):
+    monkeypatch.setattr(crypto, "_fernet", Fernet(Fernet.generate_key()))
+
+    async def run():
+        await db_start()
+        try:
+            storage = SQLiteStorage(flush_interval=60)
+            await storage.start()
+            await storage.set_data(KEY, {"phone": "+79990000000"})
+            await storage.close()
+
+            [(_, _, data)] = await _rows(db_path)
+            assert crypto.is_encrypted(data)
+            assert "+79990000000" not in data
+            assert json.loads(crypto.decrypt_value(data)) == {"phone": "+79990000000"}
+
+            restarted = SQLiteStorage(flush_interval=60)
+            await restarted.start()
+            assert await restarted.get_data(KEY) == {"phone": "+79990000000"}
+            await restarted.close()
+        finally:
+            await db_close()
+
+    asyncio.run(run())
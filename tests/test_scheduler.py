@@ -0,0 +1,40 @@
+# file: tests/test_scheduler.py
+
+import asyncio
+
+import pytest
+from telethon.errors import FloodWaitError
+
+from userbot_logic.scheduler import MAX_FLOOD_WAIT, RequestScheduler
+
+KEY = (1, "+79990000000")
+API_ID = 1
+
+
+def test_long_flood_wait_blocks_account_without_calling_telegram():
+    scheduler = RequestScheduler()
+    calls = []
+
+    async def flooded():
+        calls.append("flooded")
+        raise FloodWaitError(request=None, capture=int(MAX_FLOOD_WAIT) + 3600)
+
+    async def request():
+        calls.append("request")
+        return "ok"
+
+    async def run():
+        with pytest.raises(FloodWaitError):
+            await scheduler.call(KEY, API_ID, flooded)
+        assert scheduler.snapshot()["flood_blocked_accounts"] == 1
+
+        # Пока FloodWait не истёк, запросы аккаунта не уходят в Telegram
+        with pytest.raises(FloodWaitError) as blocked:
+            await scheduler.call(KEY, API_ID, request)
+        assert blocked.value.seconds > MAX_FLOOD_WAIT
+        assert calls == ["flooded"]
+
+        # Другие аккаунты того же API ID не блокируются
+        assert await scheduler.call((1, "+70000000000"), API_ID, request) == "ok"
+
+    asyncio.run(run())
@@ -0,0 +1,52 @@
+# file: tests/test_status_refresher.py
+
+import asyncio
+import time
+
+import aiosqlite
+
+from database.db_manager import db_close, db_save_account, db_set_accounts_status, db_start
+from userbot_logic import status_refresher
+from userbot_logic.client_pool import client_pool
+from userbot_logic.status_refresher import refresh_stale_statuses
+
+USER_ID = 1
+
+
+async def _account(db_path: str, phone: str) -> tuple[int | None, float | None]:
+    async with aiosqlite.connect(db_path) as db:
+        async with db.execute(
+            "SELECT status, last_checked FROM accounts WHERE user_id = ? AND phone = ?", (USER_ID, phone)
+        ) as cursor:
+            return await cursor.fetchone()
+
+
+def test_failing_account_does_not_starve_others(fake_telegram, db_path, monkeypatch):
+    monkeypatch.setattr(status_refresher, "STATUS_REFRESH_BATCH", 1)
+    monkeypatch.setattr(status_refresher, "STATUS_REFRESH_RATE", 0)
+    fake_telegram.failing.add("broken")
+
+    async def run():
+        await db_start()
+        try:
+            # Непроверенный аккаунт выбирается раньше давно проверенного
+            await db_save_account(USER_ID, "+70000000001", 1, "hash", "broken")
+            await db_save_account(USER_ID, "+70000000002", 1, "hash", "valid")
+            stale_at = time.time() - status_refresher.STATUS_STALE_AFTER - 60
+            await db_set_accounts_status(USER_ID, [("+70000000002", True)], stale_at)
+
+            assert await refresh_stale_statuses() == 0
+            assert await _account(db_path, "+70000000001") == (None, None)
+
+            # Неудачная проверка отложена: следующий проход достаётся другому аккаунту
+            assert await refresh_stale_statuses() == 1
+            status, last_checked = await _account(db_path, "+70000000002")
+            assert status == 1 and last_checked > stale_at
+
+            assert await refresh_stale_statuses() == 0
+            assert await _account(db_path, "+70000000001") == (None, None)
+        finally:
+            await client_pool.close()
+            await db_close()
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+# file: tests/test_userbot.py
+
+import asyncio
+
+from database.db_manager import db_close, db_get_account_details, db_save_account, db_start
+from userbot_logic.client_pool import client_pool
+from userbot_logic.overview import get_overview_page
+from userbot_logic.userbot import get_account_info, get_last_service_messages
+
+USER_ID = 1
+PHONE = "+79990000000"
+
+
+async def _with_account(check):
+    await db_start()
+    try:
+        await db_save_account(USER_ID, PHONE, 1, "hash", "session")
+        await check()
+    finally:
+        await client_pool.close()
+        await db_close()
+
+
+def test_overview_removes_revoked_account(fake_telegram):
+    async def check():
+        # Клиент уже в пуле, сессию аннулируют позже
+        text, _, _ = await get_overview_page(USER_ID, 0, force=True)
+        assert "✅" in text
+        fake_telegram.revoked.add("session")
+
+        text, _, _ = await get_overview_page(USER_ID, 0, force=True)
+        assert "❌" in text
+        assert await db_get_account_details(USER_ID, PHONE) is None
+        assert client_pool.peek(USER_ID, PHONE) is None
+
+    asyncio.run(_with_account(check))
+
+
+def test_overview_keeps_valid_account(fake_telegram):
+    async def check():
+        text, _, _ = await get_overview_page(USER_ID, 0, force=True)
+        assert "✅" in text
+        assert await db_get_account_details(USER_ID, PHONE) is not None
+
+    asyncio.run(_with_account(check))
+
+
+def test_account_info_detects_revocation_of_pooled_client(fake_telegram):
+    async def check():
+        assert "ℹ️" in await get_account_info(USER_ID, PHONE)
+        # Клиент остался в пуле и уже запомнил, что авторизован
+        fake_telegram.revoked.add("session")
+
+        text = await get_account_info(USER_ID, PHONE)
+        assert "аннулирована" in text
+        assert await db_get_account_details(USER_ID, PHONE) is None
+        assert client_pool.peek(USER_ID, PHONE) is None
+
+    asyncio.run(_with_account(check))
+
+
+def test_service_messages_detect_revocation_of_pooled_client(fake_telegram):
+    async def check():
+        assert "не найдено" in await get_last_service_messages(USER_ID, PHONE)
+        fake_telegram.revoked.add("session")
+
+        assert "недействительна" in await get_last_service_messages(USER_ID, PHONE)
+        assert client_pool.peek(USER_ID, PHONE) is None
+
+    asyncio.run(_with_account(check))
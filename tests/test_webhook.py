@@ -0,0 +1,95 @@
+# file: tests/test_webhook.py
+
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from app import WEBHOOK_PATH, create_dispatcher, create_webhook_app
+from config import BOT_TOKEN
+
+SECRET = "test-secret"
+START_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+        "text": "/start",
+    },
+}
+
+# Роутеры — синглтоны модулей, поэтому диспетчер создаётся один раз на все тесты
+dp, _ = create_dispatcher()
+
+
+class FakeBotAPI:
+    """Локальный Bot API: запоминает вызванные методы и отвечает успешным результатом."""
+
+    def __init__(self):
+        self.calls: list[tuple[str, dict]] = []
+        self.called = asyncio.Event()
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self._handle)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls.append((method, dict(await request.post())))
+        self.called.set()
+        result = {
+            "message_id": 2,
+            "date": 0,
+            "chat": {"id": 42, "type": "private"},
+            "text": "ok",
+        }
+        return web.json_response({"ok": True, "result": result})
+
+
+async def _with_webhook(check):
+    fake_api = FakeBotAPI()
+    async with TestServer(fake_api.app) as api_server:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(str(api_server.make_url("")).rstrip("/")))
+        bot = Bot(token=BOT_TOKEN, session=session)
+        async with TestClient(TestServer(create_webhook_app(bot, dp, SECRET))) as client:
+            await check(client, fake_api)
+
+
+def test_webhook_handles_update_with_secret():
+    async def check(client: TestClient, fake_api: FakeBotAPI):
+        response = await client.post(
+            WEBHOOK_PATH, json=START_UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        )
+        assert response.status == 200
+        # Апдейт обрабатывается в фоне: ждём ответа бота через фейковый Bot API
+        await asyncio.wait_for(fake_api.called.wait(), 5)
+        method, params = fake_api.calls[0]
+        assert method == "sendMessage"
+        assert params["chat_id"] == "42"
+
+    asyncio.run(_with_webhook(check))
+
+
+def test_webhook_rejects_missing_or_wrong_secret():
+    async def check(client: TestClient, fake_api: FakeBotAPI):
+        missing = await client.post(WEBHOOK_PATH, json=START_UPDATE)
+        wrong = await client.post(
+            WEBHOOK_PATH, json=START_UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+        )
+        assert missing.status == 401
+        assert wrong.status == 401
+        await asyncio.sleep(0.1)
+        assert fake_api.calls == []
+
+    asyncio.run(_with_webhook(check))
+
+
+def test_webhook_server_does_not_expose_metrics():
+    async def check(client: TestClient, fake_api: FakeBotAPI):
+        response = await client.get("/metrics")
+        assert response.status == 404
+
+    asyncio.run(_with_webhook(check))
@@ -0,0 +1,48 @@
+# file: userbot_logic/bulk.py
+
+import os
+from typing import Tuple
+
+from database.db_manager import db_delete_account
+from userbot_logic.client_pool import client_pool
+from userbot_logic.code_listener import code_listener, CODE_LISTENER_ENABLED
+from userbot_logic.userbot import probe_session, get_latest_service_code
+
+# Сколько аккаунтов группы обрабатывается одновременно
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "10"))
+# Таймаут на обработку одного аккаунта, в секундах
+BULK_TIMEOUT = float(os.getenv("BULK_TIMEOUT", "30"))
+
+# (phone, api_id, api_hash, session_string)
+AccountCredentials = Tuple[str, int, str, str]
+
+
+async def remove_account(user_id: int, phone: str):
+    """Удаляет аккаунт: отписывает от кодов, отключает клиент и стирает из БД."""
+    await code_listener.detach(user_id, phone)
+    await client_pool.discard(user_id, phone)
+    await db_delete_account(user_id, phone)
+
+
+async def probe_account(user_id: int, account: AccountCredentials) -> bool:
+    """True — сессия действительна, False — аннулирована; прочие ошибки пробрасываются."""
+    phone, api_id, api_hash, session_string = account
+    return await probe_session(session_string, api_id, api_hash, user_id, phone)
+
+
+async def remove_if_revoked(user_id: int, account: AccountCredentials) -> bool:
+    """Удаляет аккаунт, если его сессия аннулирована; возвращает True, если аккаунт удалён."""
+    if await probe_account(user_id, account):
+        return False
+    await remove_account(user_id, account[0])
+    return True
+
+
+async def fetch_latest_code(user_id: int, account: AccountCredentials):
+    """Возвращает (время, код в HTML) последнего сообщения от 777000: из слушателя кодов или запросом."""
+    phone, api_id, api_hash, session_string = account
+    if CODE_LISTENER_ENABLED:
+        code = code_listener.get_latest_code(user_id, phone)
+        if code is not None:
+            return code
+    return await get_latest_service_code(user_id, phone, api_id, api_hash, session_string)
@@ -0,0 +1,219 @@
+# file: userbot_logic/client_pool.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Tuple
+
+from monitoring.metrics import gauge, observe_call
+
+if TYPE_CHECKING:
+    # Telethon тяжёлый (~0,4 с и десятки МБ при импорте), поэтому загружается при первом создании клиента
+    from telethon import TelegramClient
+
+# Через сколько секунд простоя клиент отключается и удаляется из пула
+CLIENT_IDLE_TTL = float(os.getenv("CLIENT_IDLE_TTL", "300"))
+# Максимальное число одновременно подключённых клиентов (LRU)
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", "100"))
+# Сколько клиентов можно закрепить (их не вытесняет LRU); остальное место в пуле остаётся для обычных запросов
+CLIENT_POOL_MAX_PINNED = int(os.getenv("CLIENT_POOL_MAX_PINNED", str(CLIENT_POOL_SIZE // 2)))
+
+PoolKey = Tuple[int, str]
+
+
+def create_client(session_string: str | None, api_id: int, api_hash: str) -> "TelegramClient":
+    """Создаёт клиент Telethon из строки сессии (None — новая сессия)."""
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+
+    # FloodWait пережидает планировщик запросов, а не сам Telethon
+    return TelegramClient(StringSession(session_string), api_id, api_hash, flood_sleep_threshold=0)
+
+
+@dataclass
+class _PooledClient:
+    client: "TelegramClient"
+    session_string: str
+    last_used: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+    # Закреплённые клиенты (например, слушатели кодов) не вытесняются из пула
+    pinned: bool = False
+
+    @property
+    def evictable(self) -> bool:
+        return self.in_use == 0 and not self.pinned
+
+
+class ClientPool:
+    """Пул подключённых клиентов Telethon с ключом (user_id, phone)."""
+
+    def __init__(
+        self, idle_ttl: float = CLIENT_IDLE_TTL, max_size: int = CLIENT_POOL_SIZE, max_pinned: int = CLIENT_POOL_MAX_PINNED
+    ):
+        self.idle_ttl = idle_ttl
+        self.max_size = max_size
+        self.max_pinned = min(max_pinned, max_size)
+        self._entries: "OrderedDict[PoolKey, _PooledClient]" = OrderedDict()
+        self._locks: dict[PoolKey, asyncio.Lock] = {}
+        # Сколько корутин держат или ждут замок ключа: замок удаляется, только когда он никому не нужен
+        self._lock_users: dict[PoolKey, int] = {}
+        self._reaper: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def _locked(self, key: PoolKey) -> AsyncIterator[None]:
+        """Захватывает замок аккаунта; замок живёт, пока его держат или ждут."""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def _acquire(self, user_id: int, phone: str, api_id: int, api_hash: str, session_string: str) -> _PooledClient:
+        key = (user_id, phone)
+        self._ensure_reaper()
+        async with self._locked(key):
+            entry = self._entries.get(key)
+            # Аккаунт мог быть добавлен заново с другой сессией
+            if entry and entry.session_string != session_string:
+                await self._disconnect(key)
+                entry = None
+
+            if entry is None:
+                client = create_client(session_string, api_id, api_hash)
+                entry = _PooledClient(client, session_string)
+                self._entries[key] = entry
+
+            if not entry.client.is_connected():
+                started = time.perf_counter()
+                try:
+                    await entry.client.connect()
+                except Exception as e:
+                    observe_call("telethon", "connect", started, e)
+                    self._entries.pop(key, None)
+                    raise
+                observe_call("telethon", "connect", started)
+
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+
+        await self._enforce_limit()
+        return entry
+
+    @asynccontextmanager
+    async def client(self, user_id: int, phone: str, api_id: int, api_hash: str, session_string: str) -> AsyncIterator["TelegramClient"]:
+        """Выдаёт подключённый клиент аккаунта, при необходимости создавая или переподключая его."""
+        entry = await self._acquire(user_id, phone, api_id, api_hash, session_string)
+        broken = False
+        try:
+            yield entry.client
+        except (ConnectionError, OSError):
+            broken = True
+            raise
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            # Соединение сломано: при следующем обращении клиент будет создан заново
+            if broken:
+                await self.discard(user_id, phone)
+
+    def can_pin(self) -> bool:
+        """Есть ли место для ещё одного закреплённого клиента."""
+        return self.pinned_count() < self.max_pinned
+
+    def set_pinned(self, user_id: int, phone: str, pinned: bool) -> bool:
+        """
+        Закрепляет клиент в пуле (или снимает закрепление), чтобы он не отключался по простою.
+        Возвращает False, если клиента нет в пуле или закреплённых уже max_pinned.
+        """
+        entry = self._entries.get((user_id, phone))
+        if entry is None:
+            return False
+        if pinned and not entry.pinned and not self.can_pin():
+            return False
+        entry.pinned = pinned
+        return True
+
+    def peek(self, user_id: int, phone: str) -> "TelegramClient | None":
+        """Возвращает клиент аккаунта из пула, не подключая его."""
+        entry = self._entries.get((user_id, phone))
+        return entry.client if entry else None
+
+    async def discard(self, user_id: int, phone: str):
+        """Отключает клиент аккаунта и убирает его из пула (например, после удаления аккаунта)."""
+        key = (user_id, phone)
+        async with self._locked(key):
+            await self._disconnect(key)
+
+    async def _disconnect(self, key: PoolKey):
+        entry = self._entries.pop(key, None)
+        if entry and entry.client.is_connected():
+            try:
+                await entry.client.disconnect()
+            except Exception as e:
+                logging.warning(f"Ошибка при отключении клиента {key[1]}: {e}")
+
+    async def _enforce_limit(self):
+        # Вытесняем самые давно использованные свободные клиенты
+        while len(self._entries) > self.max_size:
+            victim = next((k for k, e in self._entries.items() if e.evictable), None)
+            if victim is None:
+                break
+            # Под замком аккаунта клиент не может быть выдан в работу, пока мы его отключаем
+            async with self._locked(victim):
+                entry = self._entries.get(victim)
+                if entry and entry.evictable:
+                    await self._disconnect(victim)
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(max(self.idle_ttl / 2, 1))
+            now = time.monotonic()
+            expired = [k for k, e in self._entries.items() if e.evictable and now - e.last_used > self.idle_ttl]
+            for key in expired:
+                async with self._locked(key):
+                    entry = self._entries.get(key)
+                    if entry and entry.evictable and now - entry.last_used > self.idle_ttl:
+                        await self._disconnect(key)
+
+    async def close(self):
+        """Отключает все клиенты пула (вызывается при остановке бота)."""
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for key in list(self._entries):
+            await self._disconnect(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def connected_count(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry.client.is_connected())
+
+    def in_use_count(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry.in_use)
+
+    def pinned_count(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry.pinned)
+
+
+client_pool = ClientPool()
+
+gauge("telethon_clients_connected", "Подключённые клиенты Telethon в пуле", client_pool.connected_count)
+gauge("telethon_clients_in_use", "Клиенты Telethon, занятые запросами", client_pool.in_use_count)
+gauge("telethon_clients_pinned", "Закреплённые клиенты Telethon (слушатели кодов)", client_pool.pinned_count)
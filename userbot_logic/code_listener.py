@@ -0,0 +1,200 @@
+# file: userbot_logic/code_listener.py
+
+import asyncio
+import html as html_lib
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Iterable, Tuple
+
+from aiogram import Bot
+
+from database.db_manager import db_get_all_accounts, db_get_account_details
+from userbot_logic.client_pool import client_pool
+from userbot_logic.concurrency import run_bulk
+from userbot_logic.scheduler import scheduler
+from userbot_logic.userbot import TELEGRAM_SERVICE_ID, extract_code_html, format_service_codes
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient, events
+
+# Включает режим постоянного прослушивания сообщений от 777000
+CODE_LISTENER_ENABLED = os.getenv("CODE_LISTENER", "0") == "1"
+# Сколько последних кодов хранить в памяти для каждого аккаунта
+CODE_BUFFER_SIZE = int(os.getenv("CODE_BUFFER_SIZE", "5"))
+# Сразу пересылать новые коды владельцу аккаунта
+CODE_PUSH_TO_OWNER = os.getenv("CODE_PUSH", "0") == "1"
+# Сколько аккаунтов подключается одновременно при старте
+CODE_LISTENER_CONCURRENCY = int(os.getenv("CODE_LISTENER_CONCURRENCY", "5"))
+
+ListenerKey = Tuple[int, str]
+
+
+@dataclass
+class _Listener:
+    client: "TelegramClient"
+    handler: Callable
+    codes: deque
+
+
+class CodeListener:
+    """Держит подключёнными клиенты аккаунтов и складывает коды от 777000 в кольцевые буферы."""
+
+    def __init__(self, buffer_size: int = CODE_BUFFER_SIZE, push_to_owner: bool = CODE_PUSH_TO_OWNER):
+        self.buffer_size = buffer_size
+        self.push_to_owner = push_to_owner
+        self._listeners: dict[ListenerKey, _Listener] = {}
+        # Подписки, которые сейчас устанавливаются: повторный attach ждёт их, а не подписывается второй раз
+        self._attaching: dict[ListenerKey, asyncio.Future] = {}
+        self._limit_warned = False
+        # Фоновые подписки новых аккаунтов (например, после массового импорта)
+        self._background: set[asyncio.Task] = set()
+        self._bot: Bot | None = None
+
+    async def start(self, bot: Bot):
+        """Подписывается на коды всех аккаунтов из БД."""
+        self._bot = bot
+        accounts = await db_get_all_accounts()
+        await self.attach_many(accounts)
+        logging.info(f"Слушатель кодов запущен для {len(self._listeners)} из {len(accounts)} аккаунтов")
+
+    async def attach_many(self, accounts: Iterable[Tuple[int, str, int, str, str]]):
+        """Подписывается на коды аккаунтов (user_id, phone, api_id, api_hash, session_string), не более CODE_LISTENER_CONCURRENCY сразу."""
+        # attach сам перехватывает ошибки подключения, поэтому результаты не разбираем
+        async for _ in run_bulk(list(accounts), lambda account: self.attach(*account), CODE_LISTENER_CONCURRENCY):
+            pass
+
+    def attach_in_background(self, accounts: Iterable[Tuple[int, str, int, str, str]]):
+        """Подписывается на коды аккаунтов в фоне, не задерживая вызывающий хендлер."""
+        task = asyncio.create_task(self.attach_many(list(accounts)))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def attach(self, user_id: int, phone: str, api_id: int, api_hash: str, session_string: str):
+        """Подключает аккаунт, загружает последние коды и подписывается на новые."""
+        key = (user_id, phone)
+        if key in self._listeners:
+            return
+        pending = self._attaching.get(key)
+        if pending is not None:
+            # Подписка уже устанавливается (двойное нажатие, импорт одновременно с вводом кода)
+            await asyncio.shield(pending)
+            return
+        # Отмечаем подписку до первого await, чтобы параллельный вызов её не продублировал
+        pending = self._attaching[key] = asyncio.get_running_loop().create_future()
+        try:
+            await self._attach(key, api_id, api_hash, session_string)
+        finally:
+            del self._attaching[key]
+            pending.set_result(None)
+
+    def _warn_pin_limit(self):
+        if not self._limit_warned:
+            self._limit_warned = True
+            logging.warning(
+                f"Слушатель кодов: достигнут лимит закреплённых клиентов ({client_pool.max_pinned}), "
+                "остальные аккаунты получают коды запросом"
+            )
+
+    async def _attach(self, key: ListenerKey, api_id: int, api_hash: str, session_string: str):
+        user_id, phone = key
+        if not client_pool.can_pin():
+            self._warn_pin_limit()
+            return
+        from telethon.errors import UnauthorizedError
+
+        try:
+            # Без предварительного is_user_authorized(): у клиента из пула его ответ кэширован
+            async with client_pool.client(user_id, phone, api_id, api_hash, session_string) as client:
+                messages = await scheduler.call(key, api_id, client.get_messages, TELEGRAM_SERVICE_ID, limit=self.buffer_size)
+        except UnauthorizedError:
+            logging.warning(f"Слушатель кодов: сессия {phone} недействительна")
+            return
+        except Exception as e:
+            logging.warning(f"Слушатель кодов: не удалось подключить {phone}: {e}")
+            return
+
+        # Буфер хранит коды от старых к новым
+        codes = deque(
+            ((msg.date, extract_code_html(msg.text)) for msg in reversed(messages)),
+            maxlen=self.buffer_size,
+        )
+
+        from telethon import events
+
+        async def handler(event: "events.NewMessage.Event"):
+            await self._on_code(key, event)
+
+        # Пока шло подключение, лимит могли занять другие аккаунты
+        if not client_pool.set_pinned(user_id, phone, True):
+            self._warn_pin_limit()
+            return
+        client.add_event_handler(handler, events.NewMessage(chats=TELEGRAM_SERVICE_ID, incoming=True))
+        self._listeners[key] = _Listener(client, handler, codes)
+
+    async def detach(self, user_id: int, phone: str):
+        """Отписывается от кодов аккаунта (например, при его удалении)."""
+        listener = self._listeners.pop((user_id, phone), None)
+        if listener:
+            listener.client.remove_event_handler(listener.handler)
+            client_pool.set_pinned(user_id, phone, False)
+
+    async def _on_code(self, key: ListenerKey, event: "events.NewMessage.Event"):
+        listener = self._listeners.get(key)
+        if not listener:
+            return
+        message_html = extract_code_html(event.message.text)
+        listener.codes.append((event.message.date, message_html))
+
+        if self.push_to_owner and self._bot:
+            user_id, phone = key
+            try:
+                await self._bot.send_message(
+                    user_id,
+                    f"✉️ Новый код для <code>{html_lib.escape(phone)}</code>:\n{message_html}",
+                    parse_mode="HTML",
+                )
+            except Exception as e:
+                logging.warning(f"Не удалось отправить код владельцу {user_id}: {e}")
+
+    def get_codes(self, user_id: int, phone: str) -> str | None:
+        """Возвращает коды аккаунта из памяти или None, если аккаунт не прослушивается."""
+        listener = self._listeners.get((user_id, phone))
+        # Клиент мог быть пересоздан пулом после обрыва соединения — тогда подписка потеряна
+        if not listener or client_pool.peek(user_id, phone) is not listener.client:
+            self._listeners.pop((user_id, phone), None)
+            return None
+        codes: list[tuple[datetime, str]] = list(reversed(listener.codes))
+        return format_service_codes(codes)
+
+    def get_latest_code(self, user_id: int, phone: str) -> tuple[datetime, str] | None:
+        """Возвращает последний код аккаунта из памяти или None, если аккаунт не прослушивается или кодов нет."""
+        listener = self._listeners.get((user_id, phone))
+        if not listener or client_pool.peek(user_id, phone) is not listener.client or not listener.codes:
+            return None
+        return listener.codes[-1]
+
+    async def get_or_attach_codes(self, user_id: int, phone: str) -> str | None:
+        """Возвращает коды из памяти, при необходимости заново подписываясь на аккаунт."""
+        codes_text = self.get_codes(user_id, phone)
+        if codes_text is None:
+            details = await db_get_account_details(user_id, phone)
+            if details:
+                api_id, api_hash, session_string = details
+                await self.attach(user_id, phone, api_id, api_hash, session_string)
+                codes_text = self.get_codes(user_id, phone)
+        return codes_text
+
+    async def stop(self):
+        """Отписывается от всех аккаунтов."""
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        for user_id, phone in list(self._listeners):
+            await self.detach(user_id, phone)
+        self._bot = None
+
+
+code_listener = CodeListener()
@@ -0,0 +1,55 @@
+# file: userbot_logic/concurrency.py
+
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Sequence, Tuple, TypeVar
+
+from userbot_logic.scheduler import with_deadline
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def run_bulk(
+    items: Sequence[T],
+    worker: Callable[[T], Awaitable[R]],
+    concurrency: int,
+    timeout: float | None = None,
+    rate: float | None = None,
+) -> AsyncIterator[Tuple[T, R | None, str | None]]:
+    """
+    Обрабатывает элементы пулом из concurrency воркеров и отдаёт (item, result, error) по мере готовности.
+    Ошибка одного элемента (включая таймаут) не останавливает остальные; rate — не более rate запусков в секунду.
+    """
+    pending: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        pending.put_nowait(item)
+    done: asyncio.Queue = asyncio.Queue()
+    next_start = time.monotonic()
+
+    async def _work():
+        nonlocal next_start
+        while not pending.empty():
+            item = pending.get_nowait()
+            if rate:
+                # Растягиваем запуски во времени: каждый воркер занимает следующий свободный слот
+                now = time.monotonic()
+                start_at, next_start = max(next_start, now), max(next_start, now) + 1 / rate
+                if start_at > now:
+                    await asyncio.sleep(start_at - now)
+            try:
+                result = await (with_deadline(worker(item), timeout) if timeout else worker(item))
+                done.put_nowait((item, result, None))
+            except asyncio.TimeoutError:
+                done.put_nowait((item, None, f"таймаут ({timeout:g} с)"))
+            except Exception as e:
+                done.put_nowait((item, None, str(e) or type(e).__name__))
+
+    workers = [asyncio.create_task(_work()) for _ in range(min(concurrency, len(items)))]
+    try:
+        for _ in range(len(items)):
+            yield await done.get()
+    finally:
+        # Если потребитель прервал итерацию, не оставляем висящих воркеров
+        for task in workers:
+            task.cancel()
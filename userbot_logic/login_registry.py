@@ -0,0 +1,87 @@
+# file: userbot_logic/login_registry.py
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from monitoring.metrics import gauge
+
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+# Через сколько секунд незавершённый вход считается брошенным и его клиент отключается
+LOGIN_TIMEOUT = float(os.getenv("LOGIN_TIMEOUT", "600"))
+
+
+@dataclass
+class _PendingLogin:
+    client: "TelegramClient"
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class LoginRegistry:
+    """Хранит подключённые клиенты незавершённых входов (от send_code_request до sign_in) по user_id."""
+
+    def __init__(self, timeout: float = LOGIN_TIMEOUT):
+        self.timeout = timeout
+        self._pending: dict[int, _PendingLogin] = {}
+        self._reaper: asyncio.Task | None = None
+
+    def put(self, user_id: int, client: "TelegramClient"):
+        """Запоминает клиент входа пользователя; предыдущий клиент, если был, отключается."""
+        previous = self._pending.get(user_id)
+        if previous and previous.client is not client:
+            asyncio.create_task(self._disconnect(previous.client))
+        self._pending[user_id] = _PendingLogin(client)
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_abandoned())
+
+    def get(self, user_id: int) -> "TelegramClient | None":
+        """Возвращает подключённый клиент входа или None (например, после перезапуска бота)."""
+        pending = self._pending.get(user_id)
+        if not pending or not pending.client.is_connected():
+            return None
+        pending.last_used = time.monotonic()
+        return pending.client
+
+    async def discard(self, user_id: int):
+        """Завершает вход пользователя и отключает его клиент."""
+        pending = self._pending.pop(user_id, None)
+        if pending:
+            await self._disconnect(pending.client)
+
+    @staticmethod
+    async def _disconnect(client: "TelegramClient"):
+        if client.is_connected():
+            try:
+                await client.disconnect()
+            except Exception as e:
+                logging.warning(f"Ошибка при отключении клиента входа: {e}")
+
+    async def _reap_abandoned(self):
+        while self._pending:
+            await asyncio.sleep(max(self.timeout / 4, 1))
+            now = time.monotonic()
+            for user_id, pending in list(self._pending.items()):
+                if now - pending.last_used > self.timeout:
+                    logging.info(f"Незавершённый вход пользователя {user_id} отменён по таймауту")
+                    await self.discard(user_id)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def close(self):
+        """Отключает все клиенты незавершённых входов (вызывается при остановке бота)."""
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for user_id in list(self._pending):
+            await self.discard(user_id)
+
+
+login_registry = LoginRegistry()
+
+gauge("login_clients_pending", "Подключённые клиенты незавершённых входов", lambda: len(login_registry))
@@ -0,0 +1,72 @@
+# file: userbot_logic/overview.py
+
+import math
+import os
+import time
+from dataclasses import dataclass
+
+from database.db_manager import db_get_user_accounts_details, db_set_accounts_status, get_accounts_set_version
+from userbot_logic.concurrency import run_bulk
+from userbot_logic.userbot import get_account_me, format_account_summary
+from userbot_logic.validator import VALIDATION_CONCURRENCY, VALIDATION_TIMEOUT
+
+# Сколько секунд сводка по аккаунтам считается актуальной
+OVERVIEW_CACHE_TTL = float(os.getenv("OVERVIEW_CACHE_TTL", "300"))
+# Сколько аккаунтов показывать на одной странице сводки
+OVERVIEW_PAGE_SIZE = int(os.getenv("OVERVIEW_PAGE_SIZE", "20"))
+
+
+@dataclass
+class _Overview:
+    lines: list[str]
+    created_at: float
+    # Версия набора аккаунтов, по которой собрана сводка: добавление или удаление аккаунта её меняет
+    accounts_version: int
+
+
+# Кэш сводок по user_id
+_overview_cache: dict[int, _Overview] = {}
+
+
+async def _collect_overview(user_id: int) -> list[str]:
+    accounts = await db_get_user_accounts_details(user_id)
+    order = {phone: index for index, (phone, *_) in enumerate(accounts)}
+
+    results = []
+    async for (phone, *_), result, error in run_bulk(
+        accounts, lambda account: get_account_me(user_id, *account), VALIDATION_CONCURRENCY, VALIDATION_TIMEOUT
+    ):
+        # Таймаут или ограничение запросов — данные и статус неизвестны
+        me, is_valid = result if error is None else (None, None)
+        results.append((phone, me, is_valid))
+    # Сводка идёт в порядке списка аккаунтов, а не в порядке готовности
+    results.sort(key=lambda r: order[r[0]])
+
+    # Попутно обновляем кэш статусов сессий
+    await db_set_accounts_status(
+        user_id, [(phone, is_valid) for phone, _, is_valid in results if is_valid is not None], time.time()
+    )
+    return [format_account_summary(phone, me, is_valid) for phone, me, is_valid in results]
+
+
+async def get_overview_page(user_id: int, page: int, force: bool = False) -> tuple[str, int, int]:
+    """Возвращает (HTML-текст страницы, номер страницы, число страниц) сводки по аккаунтам."""
+    overview = _overview_cache.get(user_id)
+    if (
+        force or overview is None
+        or overview.accounts_version != get_accounts_set_version(user_id)
+        or time.monotonic() - overview.created_at > OVERVIEW_CACHE_TTL
+    ):
+        # Версию берём до сбора: аккаунт, добавленный во время сбора, сбросит сводку при следующем открытии
+        accounts_version = get_accounts_set_version(user_id)
+        overview = _Overview(await _collect_overview(user_id), time.monotonic(), accounts_version)
+        _overview_cache[user_id] = overview
+
+    total_pages = max(math.ceil(len(overview.lines) / OVERVIEW_PAGE_SIZE), 1)
+    page = min(max(page, 0), total_pages - 1)
+    page_lines = overview.lines[page * OVERVIEW_PAGE_SIZE:(page + 1) * OVERVIEW_PAGE_SIZE]
+
+    age = int(time.monotonic() - overview.created_at)
+    header = f"<b>📊 Сводка по аккаунтам ({len(overview.lines)} шт.)</b>\n<i>Обновлено {age} с назад</i>\n\n"
+    body = "\n".join(page_lines) if page_lines else "У вас пока нет добавленных аккаунтов."
+    return header + body, page, total_pages
@@ -0,0 +1,201 @@
+# file: userbot_logic/scheduler.py
+
+import asyncio
+import logging
+import math
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from monitoring.metrics import gauge, observe_call
+
+T = TypeVar("T")
+
+# Лимиты запросов: на один аккаунт и на один API ID (запросов в секунду и размер «всплеска»)
+ACCOUNT_RATE = float(os.getenv("SCHEDULER_ACCOUNT_RATE", "1"))
+ACCOUNT_BURST = float(os.getenv("SCHEDULER_ACCOUNT_BURST", "3"))
+API_ID_RATE = float(os.getenv("SCHEDULER_API_ID_RATE", "20"))
+API_ID_BURST = float(os.getenv("SCHEDULER_API_ID_BURST", "20"))
+# FloodWait длиннее этого (в секундах) не пережидается, а возвращается вызывающему коду;
+# до конца такого FloodWait запросы аккаунта сразу завершаются FloodWaitError, не доходя до Telegram
+MAX_FLOOD_WAIT = float(os.getenv("SCHEDULER_MAX_FLOOD_WAIT", "60"))
+
+# Срок (time.monotonic), к которому вызывающий код ждёт результат; задаётся with_deadline
+_deadline: ContextVar[float | None] = ContextVar("scheduler_deadline", default=None)
+
+
+class RateLimitedError(Exception):
+    """Ожидание лимитов или FloodWait не укладывается в срок вызывающего кода: результат запроса неизвестен."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        super().__init__(f"Telegram ограничил запросы, повторите через {seconds:.0f} с")
+
+
+async def with_deadline(awaitable: Awaitable[T], timeout: float) -> T:
+    """
+    Как asyncio.wait_for, но планировщик знает срок: если очередь или FloodWait его не уложатся,
+    запрос сразу завершается RateLimitedError, а не ждёт до таймаута.
+    """
+    deadline = time.monotonic() + timeout
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    finally:
+        _deadline.reset(token)
+
+
+def _check_deadline(delay: float):
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        raise RateLimitedError(delay)
+
+
+class TokenBucket:
+    """Корзина токенов: не более rate запросов в секунду с допустимым всплеском до capacity."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Резервирует токен и возвращает, сколько секунд нужно подождать до его появления."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        # Токены могут уйти в минус: так ожидающие вызовы выстраиваются в очередь по порядку
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self):
+        """Возвращает зарезервированный токен, если запрос так и не был выполнен."""
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+
+@dataclass
+class SchedulerStats:
+    queued: int = 0
+    in_flight: int = 0
+    calls: int = 0
+    flood_waits: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class RequestScheduler:
+    """Пропускает все запросы к Telegram через лимиты на аккаунт и API ID и пережидает FloodWait."""
+
+    def __init__(self):
+        self._account_buckets: dict[Hashable, TokenBucket] = {}
+        self._api_id_buckets: dict[int, TokenBucket] = {}
+        # До какого момента (time.monotonic) аккаунт заблокирован FloodWait
+        self._flood_until: dict[Hashable, float] = {}
+        self.stats = SchedulerStats()
+
+    def _bucket(self, buckets: dict, key: Hashable, rate: float, capacity: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    async def _wait_turn(self, key: Hashable | None, api_id: int):
+        if key in self._flood_until:
+            flood_delay = self._flood_until[key] - time.monotonic()
+            if flood_delay > MAX_FLOOD_WAIT:
+                from telethon.errors import FloodWaitError
+
+                # Запрос во время длинного FloodWait только продлил бы блокировку
+                raise FloodWaitError(request=None, capture=math.ceil(flood_delay))
+            if flood_delay > 0:
+                _check_deadline(flood_delay)
+                await asyncio.sleep(flood_delay)
+            else:
+                self._flood_until.pop(key, None)
+        buckets = [self._bucket(self._api_id_buckets, api_id, API_ID_RATE, API_ID_BURST)]
+        if key is not None:
+            buckets.append(self._bucket(self._account_buckets, key, ACCOUNT_RATE, ACCOUNT_BURST))
+        delay = max(bucket.reserve() for bucket in buckets)
+        if delay > 0:
+            try:
+                _check_deadline(delay)
+            except RateLimitedError:
+                # Запрос не выполнится — не занимаем очередь за другими
+                for bucket in buckets:
+                    bucket.refund()
+                raise
+            await asyncio.sleep(delay)
+
+    async def call(self, key: Hashable | None, api_id: int, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """
+        Выполняет запрос func(*args, **kwargs) от имени аккаунта key (обычно (user_id, phone)).
+        Вызов ждёт своей очереди вместо ошибки; FloodWait до MAX_FLOOD_WAIT секунд пережидается автоматически,
+        а во время более длинного запросы аккаунта сразу завершаются FloodWaitError.
+        Внутри with_deadline ожидание, не укладывающееся в срок, завершается RateLimitedError.
+        """
+        # Telethon к этому моменту уже загружен: func — метод его клиента
+        from telethon.errors import FloodWaitError
+
+        stats = self.stats
+        # Для client(Request()) в метриках пишем имя запроса, для методов клиента — имя метода
+        method = type(args[0]).__name__ if args and not hasattr(func, "__name__") else getattr(func, "__name__", "call")
+        while True:
+            enqueued_at = time.monotonic()
+            stats.queued += 1
+            try:
+                await self._wait_turn(key, api_id)
+            finally:
+                stats.queued -= 1
+
+            waited = time.monotonic() - enqueued_at
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+            stats.calls += 1
+            stats.in_flight += 1
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+                observe_call("telethon", method, started)
+                return result
+            except FloodWaitError as e:
+                observe_call("telethon", method, started, e)
+                stats.flood_waits += 1
+                if key is not None:
+                    self._flood_until[key] = max(self._flood_until.get(key, 0.0), time.monotonic() + e.seconds)
+                if e.seconds > MAX_FLOOD_WAIT:
+                    raise
+                # Пережидать бессмысленно, если вызывающий код всё равно не дождётся
+                _check_deadline(e.seconds)
+                logging.warning(f"FloodWait {e.seconds} с для {key or api_id}: запрос поставлен в очередь")
+                if key is None:
+                    await asyncio.sleep(e.seconds)
+            except Exception as e:
+                observe_call("telethon", method, started, e)
+                raise
+            finally:
+                stats.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        """Возвращает текущие показатели очереди: глубину, число запросов в работе, время ожидания."""
+        stats = self.stats
+        now = time.monotonic()
+        return {
+            "queued": stats.queued,
+            "in_flight": stats.in_flight,
+            "calls": stats.calls,
+            "flood_waits": stats.flood_waits,
+            "avg_wait": stats.total_wait / stats.calls if stats.calls else 0.0,
+            "max_wait": stats.max_wait,
+            "flood_blocked_accounts": sum(1 for until in self._flood_until.values() if until > now),
+        }
+
+
+scheduler = RequestScheduler()
+
+gauge("scheduler_queue_depth", "Запросы к Telegram, ожидающие своей очереди", lambda: scheduler.stats.queued)
+gauge("scheduler_in_flight", "Запросы к Telegram, выполняющиеся прямо сейчас", lambda: scheduler.stats.in_flight)
+gauge("scheduler_flood_blocked_accounts", "Аккаунты, ожидающие окончания FloodWait", lambda: scheduler.snapshot()["flood_blocked_accounts"])
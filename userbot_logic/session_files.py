@@ -0,0 +1,107 @@
+# file: userbot_logic/session_files.py
+
+import io
+import os
+import sqlite3
+import zipfile
+from typing import Iterable, List, Tuple
+
+# Защита от «zip-бомб»: максимальный суммарный размер распакованных файлов
+MAX_ARCHIVE_UNPACKED_SIZE = 50 * 1024 * 1024
+
+
+def session_file_to_string(data: bytes) -> str:
+    """Преобразует содержимое .session файла Telethon (SQLiteSession) в строку StringSession."""
+    from telethon.crypto import AuthKey
+    from telethon.sessions import StringSession
+
+    conn = sqlite3.connect(":memory:")
+    try:
+        # Открываем файл сессии прямо из памяти, не записывая его на диск
+        conn.deserialize(data)
+        row = conn.execute("SELECT dc_id, server_address, port, auth_key FROM sessions").fetchone()
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"файл не является сессией Telethon ({e})") from e
+    finally:
+        conn.close()
+
+    if not row or not row[3]:
+        raise ValueError("в файле сессии нет ключа авторизации")
+
+    dc_id, server_address, port, auth_key = row
+    session = StringSession()
+    session.set_dc(dc_id, server_address, port)
+    session.auth_key = AuthKey(data=auth_key)
+    return session.save()
+
+
+def string_to_session_file(session_string: str) -> bytes:
+    """Собирает .session файл Telethon из строки StringSession целиком в памяти."""
+    from telethon.sessions import StringSession, SQLiteSession
+
+    string_session = StringSession(session_string)
+    # Без имени файла SQLiteSession создаёт базу ":memory:" со схемой нужной версии
+    sqlite_session = SQLiteSession()
+    try:
+        sqlite_session.set_dc(string_session.dc_id, string_session.server_address, string_session.port)
+        sqlite_session.auth_key = string_session.auth_key
+        sqlite_session.save()
+        return sqlite_session._conn.serialize()
+    finally:
+        sqlite_session._conn.close()
+
+
+def build_sessions_archive(accounts: Iterable[Tuple[str, str]]) -> bytes:
+    """Упаковывает пары (phone, session_string) в zip-архив с файлами <phone>.session."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for phone, session_string in accounts:
+            archive.writestr(f"{phone}.session", string_to_session_file(session_string))
+    return buffer.getvalue()
+
+
+def _parse_session_lines(name: str, text: str) -> List[Tuple[str, str | None, str | None]]:
+    items = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        items.append((f"{name}:{line_no}", line, None))
+    return items
+
+
+def parse_import_file(filename: str, data: bytes) -> List[Tuple[str, str | None, str | None]]:
+    """
+    Разбирает загруженный файл для массового импорта.
+    Поддерживаются .txt (по одной строке StringSession на строку), .session и .zip с такими файлами.
+    Возвращает список (имя элемента, session_string или None, текст ошибки или None).
+    """
+    extension = os.path.splitext(filename.lower())[1]
+    if extension == ".txt":
+        return _parse_session_lines(filename, data.decode("utf-8", errors="ignore"))
+    if extension == ".session":
+        try:
+            return [(filename, session_file_to_string(data), None)]
+        except ValueError as e:
+            return [(filename, None, str(e))]
+    if extension != ".zip":
+        raise ValueError("поддерживаются только файлы .zip, .txt и .session")
+
+    items = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            members = [m for m in archive.infolist() if not m.is_dir()]
+            if sum(m.file_size for m in members) > MAX_ARCHIVE_UNPACKED_SIZE:
+                raise ValueError("архив слишком большой")
+            for member in members:
+                member_ext = os.path.splitext(member.filename.lower())[1]
+                if member_ext == ".session":
+                    try:
+                        items.append((member.filename, session_file_to_string(archive.read(member)), None))
+                    except ValueError as e:
+                        items.append((member.filename, None, str(e)))
+                elif member_ext == ".txt":
+                    items.extend(_parse_session_lines(member.filename, archive.read(member).decode("utf-8", errors="ignore")))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"повреждённый архив ({e})") from e
+    return items
@@ -0,0 +1,82 @@
+# file: userbot_logic/status_refresher.py
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+
+from database.db_manager import db_get_stale_accounts, db_set_accounts_status, db_set_status_checks_failed
+from userbot_logic.concurrency import run_bulk
+from userbot_logic.userbot import probe_session
+
+# Через сколько секунд кэшированный статус сессии считается устаревшим
+STATUS_STALE_AFTER = float(os.getenv("STATUS_STALE_AFTER", "1800"))
+# Через сколько секунд повторять проверку, которая не удалась (сеть, FloodWait)
+STATUS_RETRY_AFTER = float(os.getenv("STATUS_RETRY_AFTER", "1800"))
+# Пауза между проходами фоновой проверки и случайная добавка к ней (в секундах)
+STATUS_REFRESH_INTERVAL = float(os.getenv("STATUS_REFRESH_INTERVAL", "300"))
+STATUS_REFRESH_JITTER = float(os.getenv("STATUS_REFRESH_JITTER", "60"))
+# Задержка первого прохода после запуска: проверка не конкурирует с запуском и не грузит Telethon сразу
+STATUS_REFRESH_START_DELAY = float(os.getenv("STATUS_REFRESH_START_DELAY", "60"))
+# Сколько аккаунтов проверяется за один проход
+STATUS_REFRESH_BATCH = int(os.getenv("STATUS_REFRESH_BATCH", "200"))
+# Ограничения нагрузки: одновременные проверки и не более N запусков проверок в секунду
+STATUS_REFRESH_CONCURRENCY = int(os.getenv("STATUS_REFRESH_CONCURRENCY", "3"))
+STATUS_REFRESH_RATE = float(os.getenv("STATUS_REFRESH_RATE", "2"))
+
+
+def is_status_stale(last_checked: float | None, now: float | None = None) -> bool:
+    """Проверяет, пора ли перепроверить статус с указанным временем последней проверки."""
+    if last_checked is None:
+        return True
+    return (now or time.time()) - last_checked > STATUS_STALE_AFTER
+
+
+async def refresh_stale_statuses() -> int:
+    """Перепроверяет одну пачку устаревших статусов и возвращает число проверенных аккаунтов."""
+    now = time.time()
+    accounts = await db_get_stale_accounts(now - STATUS_STALE_AFTER, now - STATUS_RETRY_AFTER, STATUS_REFRESH_BATCH)
+    if not accounts:
+        return 0
+
+    results: dict[int, list[tuple[str, bool]]] = defaultdict(list)
+    failed: list[tuple[int, str]] = []
+
+    async def _check(account: tuple[int, str, int, str, str]) -> bool:
+        user_id, phone, api_id, api_hash, session_string = account
+        return await probe_session(session_string, api_id, api_hash, user_id, phone)
+
+    # Запуски проверок растянуты во времени (STATUS_REFRESH_RATE), чтобы не упереться в лимиты Telegram
+    async for (user_id, phone, *_), is_valid, error in run_bulk(
+        accounts, _check, STATUS_REFRESH_CONCURRENCY, rate=STATUS_REFRESH_RATE
+    ):
+        if error is not None:
+            # Результат неизвестен (сеть, FloodWait): статус не трогаем, повторим через STATUS_RETRY_AFTER
+            logging.warning(f"Фоновая проверка {phone} не удалась: {error}")
+            failed.append((user_id, phone))
+            continue
+        results[user_id].append((phone, is_valid))
+
+    checked_at = time.time()
+    if failed:
+        await db_set_status_checks_failed(failed, checked_at)
+    for user_id, statuses in results.items():
+        await db_set_accounts_status(user_id, statuses, checked_at)
+    return sum(len(statuses) for statuses in results.values())
+
+
+async def run_status_refresher():
+    """Фоновая задача: периодически перепроверяет устаревшие статусы сессий."""
+    await asyncio.sleep(STATUS_REFRESH_START_DELAY)
+    while True:
+        try:
+            checked = await refresh_stale_statuses()
+            if checked:
+                logging.info(f"Фоновая проверка: обновлены статусы {checked} аккаунтов")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Ошибка фоновой проверки статусов: {e}")
+        await asyncio.sleep(STATUS_REFRESH_INTERVAL + random.uniform(0, STATUS_REFRESH_JITTER))
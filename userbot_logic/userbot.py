@@ -3,17 +3,108 @@
 import logging
 import re
 import html as html_lib
-from telethon import TelegramClient
-from telethon.sessions import StringSession
-from telethon.errors import AuthKeyUnregisteredError
+from datetime import datetime
 
-from database.db_manager import db_get_account_details, db_delete_account
+from database.db_manager import db_get_account_details
+from userbot_logic.client_pool import client_pool, create_client
+from userbot_logic.scheduler import scheduler
 
 # ID сервисного аккаунта Telegram
 TELEGRAM_SERVICE_ID = 777000
 
+def extract_code_html(text: str | None) -> str:
+    """Извлекает из сообщения 777000 строку «Код для входа» и переводит **...** в <b>...</b>."""
+    extracted_line = None
+    # Ищем нужную строку в тексте сообщения
+    for line in (text or "").splitlines():
+        if "Код для входа" in line:
+            extracted_line = line
+            break
+
+    if not extracted_line:
+        # Запасной вариант, если формат сообщения изменился
+        return "<i>Не удалось извлечь строку с кодом из этого сообщения.</i>"
+
+    # Безопасно преобразуем **...** в <b>...</b>, экранируя остальной текст
+    parts = re.split(r'(\*\*.*?\*\*)', extracted_line)
+    processed_parts = []
+    for part in parts:
+        if part.startswith('**') and part.endswith('**'):
+            content = part[2:-2]
+            processed_parts.append(f"<b>{html_lib.escape(content)}</b>")
+        else:
+            processed_parts.append(html_lib.escape(part))
+
+    return "".join(processed_parts)
+
+
+def format_service_codes(codes: list[tuple[datetime, str]]) -> str:
+    """Собирает HTML-ответ из пар (время сообщения, строка с кодом), от новых к старым."""
+    if not codes:
+        return "Кодов от Telegram (777000) не найдено."
+
+    # Добавляем отформатированную строку и время
+    formatted_codes = [f"<code>{date.strftime('%H:%M:%S')}</code> — {message_html}" for date, message_html in codes]
+
+    header = f"<b>Последние {len(codes)} кодов от Telegram (777000):</b>\n\n"
+    return header + "\n".join(formatted_codes)
+
+
+def format_account_info(me) -> str:
+    """Форматирует данные get_me() в HTML-карточку аккаунта."""
+    return (
+        f"<b>ℹ️ Информация об аккаунте <code>{me.phone}</code></b>\n\n"
+        f"<b>ID:</b> <code>{me.id}</code>\n"
+        f"<b>Имя:</b> {me.first_name or 'Нет'}\n"
+        f"<b>Фамилия:</b> {me.last_name or 'Нет'}\n"
+        f"<b>Юзернейм:</b> <code>@{me.username or 'Нет'}</code>\n"
+        f"<b>Premium:</b> {'Да' if me.premium else 'Нет'}"
+    )
+
+
+def format_account_summary(phone: str, me, is_valid: bool | None) -> str:
+    """Форматирует одну строку сводки по аккаунту в HTML (в том же стиле, что и карточка)."""
+    if me is None:
+        status_icon = "⚠️" if is_valid is None else "❌"
+        return f"{status_icon} <code>{html_lib.escape(phone)}</code> — нет данных"
+    return (
+        f"✅ <code>{html_lib.escape(phone)}</code> — "
+        f"<b>ID:</b> <code>{me.id}</code>, "
+        f"<code>@{me.username or 'Нет'}</code>, "
+        f"<b>Premium:</b> {'Да' if me.premium else 'Нет'}"
+    )
+
+
+async def _remove_revoked(user_id: int, phone: str):
+    """Удаляет аккаунт с аннулированной сессией вместе с подпиской на коды и клиентом из пула."""
+    # bulk импортирует этот модуль, поэтому импортируем при вызове
+    from userbot_logic.bulk import remove_account
+
+    await remove_account(user_id, phone)
+
+
+async def get_account_me(user_id: int, phone: str, api_id: int, api_hash: str, session_string: str):
+    """
+    Возвращает пару (me, is_valid) для аккаунта.
+    Аннулированная сессия удаляется из БД; при сетевой ошибке is_valid равен None.
+    """
+    try:
+        async with client_pool.client(user_id, phone, api_id, api_hash, session_string) as client:
+            me = await scheduler.call((user_id, phone), api_id, client.get_me)
+    except Exception as e:
+        logging.warning(f"Ошибка при получении данных аккаунта {phone}: {e}")
+        return None, None
+    # get_me() сам перехватывает ошибки авторизации (в т.ч. AuthKeyUnregisteredError) и возвращает None
+    if me is None:
+        await _remove_revoked(user_id, phone)
+        return None, False
+    return me, True
+
+
 async def get_account_info(user_id: int, phone: str) -> str:
     """Подключается к аккаунту и возвращает строку с информацией о нём в HTML."""
+    from telethon.errors import AuthKeyUnregisteredError, FloodWaitError, UnauthorizedError
+
     details = await db_get_account_details(user_id, phone)
     if not details:
         return "❌ Не удалось найти данные для этого аккаунта."
@@ -21,110 +112,102 @@ async def get_account_info(user_id: int, phone: str) -> str:
     api_id, api_hash, session_string = details
     info_text = ""
 
-    client = TelegramClient(StringSession(session_string), api_id, api_hash)
     try:
-        await client.connect()
-        if not await client.is_user_authorized():
-            raise AuthKeyUnregisteredError
-
-        me = await client.get_me()
-        info_text = (
-            f"<b>ℹ️ Информация об аккаунте <code>{me.phone}</code></b>\n\n"
-            f"<b>ID:</b> <code>{me.id}</code>\n"
-            f"<b>Имя:</b> {me.first_name or 'Нет'}\n"
-            f"<b>Фамилия:</b> {me.last_name or 'Нет'}\n"
-            f"<b>Юзернейм:</b> <code>@{me.username or 'Нет'}</code>\n"
-            f"<b>Premium:</b> {'Да' if me.premium else 'Нет'}"
-        )
-    except AuthKeyUnregisteredError:
+        # is_user_authorized() у клиента из пула кэширует старый ответ, а get_me()
+        # возвращает None для аннулированной сессии — проверяем по нему
+        async with client_pool.client(user_id, phone, api_id, api_hash, session_string) as client:
+            me = await scheduler.call((user_id, phone), api_id, client.get_me)
+        if me is None:
+            raise AuthKeyUnregisteredError(request=None)
+        info_text = format_account_info(me)
+    except UnauthorizedError:
         info_text = "❌ <b>Ошибка:</b> Сессия была аннулирована. Пожалуйста, удалите и добавьте аккаунт заново."
-        await db_delete_account(user_id, phone)
+        await _remove_revoked(user_id, phone)
+    except FloodWaitError as e:
+        info_text = f"⏳ Telegram ограничил запросы этого аккаунта. Повторите через {e.seconds} с."
     except Exception as e:
         logging.error(f"Ошибка при получении информации: {e}")
         info_text = f"❌ Произошла неизвестная ошибка при подключении: {e}"
-    finally:
-        if client.is_connected():
-            await client.disconnect()
     
     return info_text
 
 
-async def check_session_validity(session_string: str, api_id: int, api_hash: str) -> bool:
-    """Быстро проверяет, действительна ли сессия, не сбрасывая её."""
-    client = TelegramClient(StringSession(session_string), api_id, api_hash)
-    is_valid = False
+async def probe_session(session_string: str, api_id: int, api_hash: str, user_id: int, phone: str) -> bool:
+    """
+    Проверяет сессию лёгким запросом к серверу: True — действительна, False — аннулирована.
+    Сетевые и прочие ошибки пробрасываются, чтобы их не путали с аннулированной сессией.
+    """
+    from telethon.errors import UnauthorizedError
+    from telethon.tl.functions.updates import GetStateRequest
+
     try:
-        await client.connect()
-        if await client.is_user_authorized():
-            is_valid = True
+        async with client_pool.client(user_id, phone, api_id, api_hash, session_string) as client:
+            # is_user_authorized() кэширует ответ на время жизни клиента,
+            # поэтому для клиента из пула делаем лёгкий запрос к серверу напрямую
+            await scheduler.call((user_id, phone), api_id, client, GetStateRequest())
+        return True
+    except UnauthorizedError:
+        await client_pool.discard(user_id, phone)
+        return False
+
+
+async def check_session_validity(
+    session_string: str, api_id: int, api_hash: str, user_id: int, phone: str
+) -> bool | None:
+    """Быстро проверяет, действительна ли сессия, не сбрасывая её; None — результат неизвестен (сеть, FloodWait)."""
+    try:
+        return await probe_session(session_string, api_id, api_hash, user_id, phone)
     except Exception as e:
-        logging.warning(f"Ошибка проверки сессии: {e}")
-        is_valid = False
+        logging.warning(f"Ошибка проверки сессии {phone}: {e}")
+        return None
+
+
+async def resolve_session_phone(session_string: str, api_id: int, api_hash: str) -> str:
+    """Подключается с сессией неизвестного аккаунта и возвращает его номер телефона."""
+    client = create_client(session_string, api_id, api_hash)
+    try:
+        await client.connect()
+        if not await scheduler.call(None, api_id, client.is_user_authorized):
+            raise ValueError("сессия не авторизована")
+
+        me = await scheduler.call(None, api_id, client.get_me)
+        return f"+{me.phone}"
     finally:
         if client.is_connected():
             await client.disconnect()
-            
-    return is_valid
 
 
 async def get_last_service_messages(user_id: int, phone: str) -> str:
     """Подключается к аккаунту и извлекает только строки с кодами из последних 5 сообщений."""
+    from telethon.errors import FloodWaitError, UnauthorizedError
+
     details = await db_get_account_details(user_id, phone)
     if not details:
         return "❌ Не удалось найти данные для этого аккаунта."
 
     api_id, api_hash, session_string = details
-    
-    client = TelegramClient(StringSession(session_string), api_id, api_hash)
+
     try:
-        await client.connect()
-        if not await client.is_user_authorized():
-            raise AuthKeyUnregisteredError
-
-        messages = await client.get_messages(TELEGRAM_SERVICE_ID, limit=5)
-
-        if not messages:
-            return "Кодов от Telegram (777000) не найдено."
-
-        formatted_codes = []
-        for msg in messages:
-            extracted_line = None
-            # Ищем нужную строку в тексте сообщения
-            for line in msg.text.splitlines():
-                if "Код для входа" in line:
-                    extracted_line = line
-                    break
-            
-            # Если нашли строку, форматируем её
-            if extracted_line:
-                # Безопасно преобразуем **...** в <b>...</b>, экранируя остальной текст
-                parts = re.split(r'(\*\*.*?\*\*)', extracted_line)
-                processed_parts = []
-                for part in parts:
-                    if part.startswith('**') and part.endswith('**'):
-                        content = part[2:-2]
-                        processed_parts.append(f"<b>{html_lib.escape(content)}</b>")
-                    else:
-                        processed_parts.append(html_lib.escape(part))
-                
-                message_html = "".join(processed_parts)
-            else:
-                # Запасной вариант, если формат сообщения изменился
-                message_html = "<i>Не удалось извлечь строку с кодом из этого сообщения.</i>"
-
-            # Добавляем отформатированную строку и время
-            formatted_codes.append(
-                f"<code>{msg.date.strftime('%H:%M:%S')}</code> — {message_html}"
-            )
-        
-        header = f"<b>Последние {len(messages)} кодов от Telegram (777000):</b>\n\n"
-        return header + "\n".join(formatted_codes)
-
-    except AuthKeyUnregisteredError:
+        # Аннулированная сессия проявится ошибкой get_messages: is_user_authorized() клиента из пула кэширован
+        async with client_pool.client(user_id, phone, api_id, api_hash, session_string) as client:
+            messages = await scheduler.call((user_id, phone), api_id, client.get_messages, TELEGRAM_SERVICE_ID, limit=5)
+
+        return format_service_codes([(msg.date, extract_code_html(msg.text)) for msg in messages])
+
+    except UnauthorizedError:
+        await client_pool.discard(user_id, phone)
         return "❌ <b>Ошибка:</b> Сессия недействительна. Пожалуйста, перезайдите в аккаунт."
+    except FloodWaitError as e:
+        return f"⏳ Telegram ограничил запросы этого аккаунта. Повторите через {e.seconds} с."
     except Exception as e:
         logging.error(f"Ошибка при получении сообщений: {e}")
         return f"❌ Произошла ошибка при получении сообщений: {e}"
-    finally:
-        if client.is_connected():
-            await client.disconnect()
\ No newline at end of file
+
+
+async def get_latest_service_code(user_id: int, phone: str, api_id: int, api_hash: str, session_string: str):
+    """Возвращает (время, строка с кодом в HTML) последнего сообщения от 777000 или None; ошибки пробрасываются."""
+    async with client_pool.client(user_id, phone, api_id, api_hash, session_string) as client:
+        messages = await scheduler.call((user_id, phone), api_id, client.get_messages, TELEGRAM_SERVICE_ID, limit=1)
+    if not messages:
+        return None
+    return messages[0].date, extract_code_html(messages[0].text)
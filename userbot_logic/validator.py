@@ -0,0 +1,42 @@
+# file: userbot_logic/validator.py
+
+import logging
+import os
+from contextlib import aclosing
+from typing import AsyncIterator, Iterable, Tuple
+
+from userbot_logic.concurrency import run_bulk
+from userbot_logic.userbot import check_session_validity
+
+# Сколько проверок сессий может выполняться одновременно
+VALIDATION_CONCURRENCY = int(os.getenv("VALIDATION_CONCURRENCY", "10"))
+# Таймаут на проверку одного аккаунта (в секундах)
+VALIDATION_TIMEOUT = float(os.getenv("VALIDATION_TIMEOUT", "15"))
+
+# (phone, api_id, api_hash, session_string)
+AccountCredentials = Tuple[str, int, str, str]
+
+
+async def iter_session_validity(
+    user_id: int,
+    accounts: Iterable[AccountCredentials],
+    concurrency: int | None = None,
+    timeout: float | None = None,
+) -> AsyncIterator[Tuple[str, bool | None]]:
+    """
+    Параллельно проверяет сессии и отдаёт пары (phone, is_valid) по мере готовности.
+    is_valid равен None, если проверка не удалась (таймаут, сеть, FloodWait): такой результат не сохраняется.
+    """
+    timeout = timeout or VALIDATION_TIMEOUT
+
+    async def _check(account: AccountCredentials) -> bool | None:
+        phone, api_id, api_hash, session_string = account
+        return await check_session_validity(session_string, api_id, api_hash, user_id, phone)
+
+    results = run_bulk(list(accounts), _check, concurrency or VALIDATION_CONCURRENCY, timeout)
+    # aclosing: если потребитель прервал итерацию, висящие проверки отменяются сразу
+    async with aclosing(results):
+        async for (phone, *_), is_valid, error in results:
+            if error is not None:
+                logging.warning(f"Проверка сессии {phone} не удалась: {error}")
+            yield phone, is_valid